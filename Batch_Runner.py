@@ -0,0 +1,166 @@
+# Offline batch mode: replays recorded conversations through the chatbot concurrently
+# Usage: python Batch_Runner.py conversations.jsonl results.jsonl --concurrency 16 --rate 5
+#
+# Each input line is one conversation: {"id": "abc", "turns": ["first user message", "second", ...]}
+# Each output line is written as soon as its conversation finishes:
+# {"id": "abc", "turns": [{"user": ..., "assistant": ..., "latency_ms": ...}], "elapsed_ms": ...}
+# A conversation stops at its first failed turn and is written with an "error" field instead; such
+# results are redone on the next run. Conversations already present in the output file without an
+# error are skipped, so an interrupted run can be resumed. Malformed input lines are skipped with a warning.
+import os  # Provides functionalities for interacting with the operating system
+import re  # Turns conversation ids into safe file names
+import json  # For handling JSON data
+import time  # For timing turns and pacing requests
+import asyncio  # Runs conversations concurrently
+import argparse  # To parse command-line arguments
+from typing import Dict, Iterator, Set  # For type hinting complex data structures
+from Language_Model import AsyncChatBot, ConversationHistory  # Chatbot and isolated histories
+
+# Spaces requests out so the batch stays under the provider's rate limit
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate  # Requests per second (0 disables limiting)
+        self.burst = burst  # Requests allowed back to back after an idle period
+        self.tokens = float(burst)  # Currently available requests
+        self.updated = time.monotonic()  # Last time tokens were refilled
+        self.lock = asyncio.Lock()  # Callers wait their turn in order
+
+    async def acquire(self):
+        # Waits until a request may be sent
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def read_conversations(input_file: str) -> Iterator[Dict]:
+    # Streams conversations from the input JSONL file, skipping lines that are not a valid conversation
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                conversation = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Warning: Skipping line {number}, not valid JSON ({e})")
+                continue
+            turns = conversation.get("turns") if isinstance(conversation, dict) else None
+            if not isinstance(turns, list) or not all(isinstance(turn, str) for turn in turns):
+                print(f"Warning: Skipping line {number}, expected {{\"id\", \"turns\": [\"...\"]}}")
+                continue
+            conversation.setdefault("id", str(number))  # Line number when no id is given
+            yield conversation
+
+def completed_ids(output_file: str) -> Set[str]:
+    # Ids of conversations that already have a successful result, used to resume a run
+    done = set()
+    if os.path.exists(output_file):
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                    if "error" not in result:  # Failed conversations are redone
+                        done.add(str(result["id"]))
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    pass  # Torn last line from an interrupted run, that conversation is redone
+    return done
+
+async def run_conversation(conversation: Dict, args: argparse.Namespace, limiter: RateLimiter) -> Dict:
+    # Runs every turn of one conversation through its own history, stopping at the first failed turn
+    safe_id = re.sub(r"[^\w.-]", "_", str(conversation["id"]))  # Ids become file names
+    history_file = os.path.join(args.work_dir, f"{safe_id}.jsonl")
+    history = ConversationHistory(history_file=history_file, legacy_file=None, retrieval=args.retrieval)
+    history.clear_history()  # Start clean, also when redoing a conversation after an interruption
+    chatbot = AsyncChatBot(model_name=args.model, history=history, summarize=False, base_url=args.base_url,
+                           personality_file=args.personality or "personality.txt",
+                           user=f"batch:{conversation['id']}", priority="batch")  # Yields to interactive users
+
+    started = time.perf_counter()
+    turns = []
+    error = None  # Set by a failed turn
+    for user_input in conversation["turns"]:
+        await limiter.acquire()
+        turn_started = time.perf_counter()
+        stored = len(history.messages)
+        response = await chatbot.aget_response(user_input)
+        if len(history.messages) == stored:  # Failed turns are not stored; later turns would lack context
+            error = response
+            break
+        turns.append({
+            "user": user_input,
+            "assistant": response,
+            "latency_ms": round(1000 * (time.perf_counter() - turn_started), 1),
+        })
+    if not args.keep_histories:
+        history.clear_history()
+    result = {"id": conversation["id"], "turns": turns, "elapsed_ms": round(1000 * (time.perf_counter() - started), 1)}
+    if error is not None:
+        result["error"] = error
+    return result
+
+async def run_batch(args: argparse.Namespace):
+    # Runs all pending conversations with bounded concurrency, writing results as they complete
+    os.makedirs(args.work_dir, exist_ok=True)
+    AsyncChatBot.max_connections = args.concurrency  # Size the shared request pool to the batch
+    if args.personality and not os.path.exists(args.personality):
+        raise SystemExit(f"Personality file not found: {args.personality}")
+
+    done = completed_ids(args.output)
+    limiter = RateLimiter(args.rate, burst=max(1, int(args.rate)))
+    slots = asyncio.Semaphore(args.concurrency)
+    written = skipped = failed = 0
+    started = time.perf_counter()
+
+    with open(args.output, 'a', encoding='utf-8') as out:
+        async def worker(conversation: Dict):
+            nonlocal written, failed
+            try:
+                result = await run_conversation(conversation, args, limiter)
+            except Exception as e:  # One bad conversation must not stop the batch
+                result = {"id": conversation["id"], "turns": [], "elapsed_ms": 0.0, "error": f"Error: {e}"}
+            finally:
+                slots.release()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()  # Each finished conversation survives an interruption
+            if "error" in result:
+                failed += 1
+                print(f"[failed] {conversation['id']} after {len(result['turns'])} turns: {result['error'].strip().splitlines()[0]}")
+                return
+            written += 1
+            print(f"[{written}] {conversation['id']}: {len(result['turns'])} turns in {result['elapsed_ms']:.0f} ms")
+
+        tasks = []
+        for conversation in read_conversations(args.input):
+            if str(conversation["id"]) in done:
+                skipped += 1
+                continue
+            await slots.acquire()  # Bounded concurrency without reading the whole input up front
+            tasks.append(asyncio.create_task(worker(conversation)))
+        await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {written} conversations in {elapsed:.1f} s ({written / elapsed if elapsed else 0:.2f}/s), "
+          f"{skipped} already completed, {failed} failed (redone on the next run)")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay a JSONL file of conversations through the chatbot")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"turns\"} conversation per line")
+    parser.add_argument("output", help="JSONL file results are appended to (also used to resume)")
+    parser.add_argument("--model", default="meta-llama/Llama-3.2-11B-Vision-Instruct", help="Model name to use")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint to use instead of Hugging Face")
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations processed at the same time")
+    parser.add_argument("--rate", type=float, default=0, help="Maximum requests per second (0 = unlimited)")
+    parser.add_argument("--work-dir", default="batch_histories", help="Directory for per-conversation histories")
+    parser.add_argument("--personality", help="Personality file to use instead of personality.txt")
+    parser.add_argument("--retrieval", action="store_true", help="Recall older turns within each conversation")
+    parser.add_argument("--keep-histories", action="store_true", help="Keep per-conversation history files")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(run_batch(parse_args()))
@@ -0,0 +1,113 @@
+# Importing required libraries and modules
+import queue  # Hands utterances to the batching worker
+import threading  # Background classification worker
+from concurrent.futures import Future  # Result handle for each submitted utterance
+from typing import List, Dict, Optional  # For type hinting
+from Resources import shared  # One detector per process
+
+# Replaces deprecated/emotion_voice_detector.py, which reloaded the model on every call and needed a file path
+
+EMOTION_MODEL = "speechbrain/emotion-recognition-wav2vec2-IEMOCAP"  # Pre-trained model source
+EMOTION_LABELS = {"neu": "neutral", "ang": "angry", "hap": "happy", "sad": "sad"}  # Model labels to readable names
+SAMPLE_RATE = 16000  # The model and the speech-to-text stage both use 16 kHz mono audio
+
+_model = None  # Loaded once per process
+_model_lock = threading.Lock()  # Prevents two threads loading the model at the same time
+
+def load_emotion_model(savedir: str = "tmp_model"):
+    """
+    Loads the SpeechBrain emotion classifier once and returns the cached instance.
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            from speechbrain.inference.interfaces import foreign_class  # Model ships its own interface class
+            _model = foreign_class(
+                source=EMOTION_MODEL,
+                pymodule_file="custom_interface.py",
+                classname="CustomEncoderWav2vec2Classifier",
+                savedir=savedir,  # Directory to save the model locally
+            )
+            _model.mods.eval()
+    return _model
+
+def classify_buffers(buffers: List) -> List[Optional[Dict]]:
+    """
+    Classifies a batch of in-memory float32 16 kHz NumPy buffers in one forward pass.
+    A single buffer is wrapped without copying; several are padded into one batch tensor.
+    Returns one {"emotion", "confidence", "scores"} dict per buffer (None for empty buffers).
+    """
+    import torch
+
+    model = load_emotion_model()
+    usable = [i for i, buffer in enumerate(buffers) if buffer is not None and len(buffer)]
+    results: List[Optional[Dict]] = [None] * len(buffers)
+    if not usable:
+        return results
+
+    if len(usable) == 1:
+        wavs = torch.from_numpy(buffers[usable[0]]).float().unsqueeze(0)  # Shares memory with a float32 NumPy buffer
+        wav_lens = torch.ones(1)
+    else:
+        longest = max(len(buffers[i]) for i in usable)
+        wavs = torch.zeros(len(usable), longest)
+        for row, i in enumerate(usable):
+            wavs[row, :len(buffers[i])] = torch.from_numpy(buffers[i])
+        wav_lens = torch.tensor([len(buffers[i]) / longest for i in usable])  # Relative lengths, as SpeechBrain expects
+
+    with torch.inference_mode():
+        out_prob, score, index, labels = model.classify_batch(wavs, wav_lens)
+
+    label_names = [model.hparams.label_encoder.ind2lab[i] for i in range(out_prob.shape[-1])]
+    probabilities = out_prob.exp().reshape(len(usable), -1)
+    for row, i in enumerate(usable):
+        results[i] = {
+            "emotion": EMOTION_LABELS.get(labels[row], labels[row]),
+            "confidence": round(float(probabilities[row].max()), 3),
+            "scores": {EMOTION_LABELS.get(name, name): round(float(p), 3) for name, p in zip(label_names, probabilities[row])},
+        }
+    return results
+
+# Collects utterances from the voice pipeline and classifies them in small batches
+class EmotionDetector:
+    """
+    submit() returns immediately with a Future; a background worker groups whatever
+    utterances arrived within `max_wait` seconds (up to `batch_size`) into one CPU
+    forward pass. The model is loaded on the worker thread the first time it is needed.
+    """
+
+    def __init__(self, batch_size: int = 8, max_wait: float = 0.05):
+        self.batch_size = batch_size  # Most utterances classified in one pass
+        self.max_wait = max_wait  # How long to wait for more utterances to join a batch
+        self.pending = queue.Queue()  # (buffer, future) pairs waiting for classification
+        self.worker = threading.Thread(target=self._run, name="emotion-detector", daemon=True)
+        self.worker.start()
+
+    def submit(self, buffer) -> Future:
+        # Queues one utterance's audio for classification
+        future = Future()
+        self.pending.put((buffer, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]  # Wait for the first utterance
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.pending.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            try:
+                results = classify_buffers([buffer for buffer, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                print(f"Error in emotion detection: {e}")
+                for _, future in batch:
+                    future.set_result(None)  # Emotion is optional, the turn goes on without it
+
+def get_emotion_detector() -> EmotionDetector:
+    """
+    Returns the process-wide emotion detector shared by all voice sessions, creating it on first use.
+    """
+    return shared("emotion_detector", EmotionDetector)
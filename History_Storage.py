@@ -0,0 +1,878 @@
+# Importing required libraries and modules
+import os  # Provides functionalities for interacting with the operating system
+import json  # For handling JSON data
+import sqlite3  # Multi-user history database
+import datetime  # Time range queries
+import time  # fsync interval of the write-behind storage
+import atexit  # Flushes queued history writes when the process exits
+import weakref  # The background writer does not keep storages alive
+import threading  # Serializes access to a shared SQLite connection, background writer
+from array import array  # Compact storage for the line offset index
+from Metrics import span  # Times the background group writes
+from typing import List, Dict, Optional, Iterable, Iterator, Callable, Any, Tuple, Union  # For type hinting complex data structures
+
+def _dumps(record: Dict) -> str:
+    # Compact one-line JSON encoding shared by the backends
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+# Interface every history backend implements
+class HistoryStorage:
+    """
+    ConversationHistory only talks to its backend through these methods, so the JSONL
+    journal and the SQLite database are interchangeable. Records are plain dicts
+    (serialized Messages) addressed by their position in the history, oldest first.
+    A cursor is an opaque, growing marker of how much has been written; it lets the
+    search index catch up on records stored after it was last saved.
+    Side data (running summary, search index) is kept with load_meta/save_meta.
+    """
+
+    def prepare(self):
+        # Creates, migrates or repairs the underlying storage before first use
+        pass
+
+    def append(self, record: Dict):
+        raise NotImplementedError
+
+    def append_many(self, records: Iterable[Dict]):
+        # Stores several records in order; backends override this to batch the writes
+        for record in records:
+            self.append(record)
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def warm(self):
+        # Builds whatever random access to older records needs, so the first request doesn't pay for it
+        pass
+
+    def read_tail(self, count: int) -> List[Dict]:
+        raise NotImplementedError
+
+    def read_range(self, start: int, stop: int) -> List[Dict]:
+        raise NotImplementedError
+
+    def iter_records(self, start: int = 0) -> Iterator[Dict]:
+        # Streams the records written after cursor `start` (0 streams everything)
+        raise NotImplementedError
+
+    def cursor(self) -> int:
+        raise NotImplementedError
+
+    def rewrite(self, records: Iterable[Dict]):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def sync(self):
+        # Forces everything written so far onto the disk
+        pass
+
+    def flush(self):
+        # Makes every record appended so far durable (write-behind storages write their queue first)
+        self.sync()
+
+    def load_meta(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def save_meta(self, key: str, value: str):
+        raise NotImplementedError
+
+    def delete_meta(self, key: str):
+        raise NotImplementedError
+
+# Stands in for a journal line that can't be parsed (rewritten as such if the history is compacted)
+CORRUPT_RECORD = {"role": "system", "content": "[Unreadable history record]", "timestamp": ""}
+
+# Append-only JSONL journal used to persist the conversation history
+class JournalStorage(HistoryStorage):
+    """
+    Stores one JSON record per line and only ever appends to the file.
+    Adding a message costs a single small write instead of rewriting the whole history.
+    A torn final line (e.g. the process died mid-write) is truncated away on load,
+    and a legacy JSON array file is migrated into the journal the first time it is seen.
+    The cursor is the journal size in bytes, and side data lives in `<journal>.<key>.json`.
+    """
+
+    BLOCK_SIZE = 64 * 1024  # Bytes read per step when scanning the journal backwards
+
+    def __init__(self, journal_file: str, legacy_file: Optional[str] = None, fsync: bool = False):
+        self.journal_file = journal_file  # Path to the JSONL journal
+        self.legacy_file = legacy_file  # Optional path to the old JSON array history file
+        self.fsync = fsync  # Force every append to disk (slower, survives power loss)
+        self._offsets: Optional[array] = None  # Byte offset of every record, built on first random access
+        self.lock = threading.RLock()  # Readers may run on other threads than the writer (e.g. the summarizer)
+
+    def load(self) -> List[Dict]:
+        # Loads every record from the journal, migrating and repairing the file if needed
+        self.prepare()
+        return list(self.iter_records())
+
+    def prepare(self):
+        # Migrates the legacy file and repairs a torn tail; only touches the end of the journal
+        if not os.path.exists(self.journal_file):
+            self.migrate_legacy()  # One-shot migration from the old JSON array format
+        if os.path.exists(self.journal_file):
+            self.repair_tail()
+
+    def repair_tail(self):
+        # Fixes the final line if the last write was interrupted before its newline
+        size = os.path.getsize(self.journal_file)
+        if size == 0:
+            return
+        with open(self.journal_file, 'r+b') as f:
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return  # The last record is complete
+            start = self._find_line_start(f, size)
+            f.seek(start)
+            tail = f.read()
+            try:
+                json.loads(tail)
+                f.write(b"\n")  # Complete record that only lost its newline, terminate it
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                print("Warning: Recovered from a torn history write.")
+                f.truncate(start)  # Drop the torn tail so later appends start on a clean line
+        self._offsets = None
+
+    def _find_line_start(self, f, end: int) -> int:
+        # Walks backwards from `end` to the byte just after the previous newline
+        pos = end
+        while pos > 0:
+            read_from = max(0, pos - self.BLOCK_SIZE)
+            f.seek(read_from)
+            block = f.read(pos - read_from)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                return read_from + newline + 1
+            pos = read_from
+        return 0
+
+    def _decode(self, line: bytes, offset: int) -> Optional[Dict]:
+        # Parses one journal line: None for a blank line, a placeholder record for a corrupt one.
+        # Every non-blank line keeps its position, so the offset index, iter_records, read_tail
+        # and the search index's document ids all agree.
+        if not line.strip():
+            return None
+        try:
+            return json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"Warning: Unreadable history record at byte {offset}, using a placeholder.")
+            return dict(CORRUPT_RECORD)
+
+    def size(self) -> int:
+        # Current size of the journal in bytes (0 if it does not exist yet)
+        return os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+
+    def cursor(self) -> int:
+        return self.size()
+
+    def iter_records(self, start: int = 0) -> Iterator[Dict]:
+        # Streams records from byte offset `start` without holding the file in memory
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                record = self._decode(line, offset)
+                if record is not None:
+                    yield record
+                offset += len(line)
+
+    def read_tail(self, count: int) -> List[Dict]:
+        # Reads the last `count` records by scanning backwards from the end of the file
+        with self.lock:
+            if count <= 0 or not os.path.exists(self.journal_file):
+                return []
+            records = []
+            with open(self.journal_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                pos = f.tell()
+                buffer = b""
+                while pos > 0 and len(records) < count:
+                    read_from = max(0, pos - self.BLOCK_SIZE)
+                    f.seek(read_from)
+                    buffer = f.read(pos - read_from) + buffer
+                    pos = read_from
+                    lines = buffer.split(b"\n")
+                    buffer = lines[0] if pos > 0 else b""  # First piece may be a partial line
+                    complete = lines[1:] if pos > 0 else lines
+                    for i in range(len(complete) - 1, -1, -1):
+                        record = self._decode(complete[i], pos)
+                        if record is not None:
+                            records.append(record)
+                            if len(records) == count:
+                                break
+            records.reverse()
+            return records
+
+    def build_offsets(self) -> "array":
+        # Builds an index of the byte offset of every non-blank line, without parsing JSON
+        offsets = array('q')
+        if not os.path.exists(self.journal_file):
+            return offsets
+        with open(self.journal_file, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    offsets.append(offset)
+                offset += len(line)
+        return offsets
+
+    def _index(self) -> "array":
+        # Lazily builds the offset index for random access into older records
+        with self.lock:
+            if self._offsets is None:
+                self._offsets = self.build_offsets()
+            return self._offsets
+
+    def count(self) -> int:
+        return len(self._index())
+
+    def warm(self):
+        self._index()
+
+    def read_at(self, offset: int) -> Optional[Dict]:
+        # Reads the single record that starts at `offset`
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            return self._decode(f.readline(), offset)
+
+    def read_range(self, start: int, stop: int) -> List[Dict]:
+        # Reads the records at positions start..stop-1 with one seek and a sequential read
+        with self.lock:
+            offsets = self._index()
+            start, stop = max(0, start), min(stop, len(offsets))
+            if start >= stop:
+                return []
+            records = []
+            with open(self.journal_file, 'rb') as f:
+                f.seek(offsets[start])
+                for position in range(start, stop):
+                    line = f.readline()
+                    if not line.strip():  # Blank lines are not indexed, skip to the next record
+                        f.seek(offsets[position])
+                        line = f.readline()
+                    records.append(self._decode(line, offsets[position]))
+            return records
+
+    def migrate_legacy(self):
+        # Converts the old indented JSON array file into the journal format
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        try:
+            with open(self.legacy_file, 'r') as f:
+                data = json.load(f)  # Load the JSON array
+        except json.JSONDecodeError:
+            print("Warning: Could not load history file. Starting fresh.")  # Handle file corruption
+            return
+        self.rewrite(data)  # Write the journal atomically
+        os.remove(self.legacy_file)  # The journal is now the source of truth
+        print(f"Migrated {len(data)} messages from {self.legacy_file} to {self.journal_file}.")
+
+    def append(self, record: Dict) -> int:
+        # Appends a single record as one line and returns the byte offset it was written at
+        with self.lock:
+            line = (_dumps(record) + "\n").encode('utf-8')
+            with open(self.journal_file, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            if self._offsets is not None:
+                self._offsets.append(offset)
+            return offset
+
+    def append_many(self, records: Iterable[Dict]):
+        # Appends several records with a single write
+        with self.lock:
+            lines = [(_dumps(record) + "\n").encode('utf-8') for record in records]
+            if not lines:
+                return
+            with open(self.journal_file, 'ab') as f:
+                offset = f.tell()
+                f.write(b"".join(lines))
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            if self._offsets is not None:
+                for line in lines:
+                    self._offsets.append(offset)
+                    offset += len(line)
+
+    def rewrite(self, records: Iterable[Dict]):
+        # Rewrites the journal from scratch (compaction), atomically via a temporary file
+        with self.lock:
+            tmp_file = self.journal_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(_dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())  # Make sure the new journal is on disk before swapping it in
+            os.replace(tmp_file, self.journal_file)
+            self._offsets = None  # Byte offsets changed
+
+    def _meta_file(self, key: str) -> str:
+        return f"{self.journal_file}.{key}.json"
+
+    def load_meta(self, key: str) -> Optional[str]:
+        # Reads side data stored next to the journal
+        path = self._meta_file(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def save_meta(self, key: str, value: str):
+        # Writes side data next to the journal, atomically
+        tmp_file = self._meta_file(key) + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp_file, self._meta_file(key))  # Never a half-written file
+
+    def sync(self):
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'rb') as f:
+                os.fsync(f.fileno())
+
+    def delete_meta(self, key: str):
+        if os.path.exists(self._meta_file(key)):
+            os.remove(self._meta_file(key))
+
+    def clear(self):
+        # Deletes the journal and any legacy file so it is not migrated back in (side data is kept)
+        with self.lock:
+            for path in (self.journal_file, self.legacy_file):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            self._offsets = None
+
+
+# Shared connection per database file, so many users' histories don't each hold one open
+_connections: Dict[str, Tuple[sqlite3.Connection, threading.RLock]] = {}
+_connections_lock = threading.Lock()
+
+def _connect(db_file: str) -> Tuple[sqlite3.Connection, threading.RLock]:
+    # Opens (once per process) a WAL-mode connection to `db_file` and creates the schema
+    key = os.path.abspath(db_file)
+    with _connections_lock:
+        if key not in _connections:
+            connection = sqlite3.connect(db_file, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, one fsync less per commit
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    record TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_user_timestamp ON messages(user, timestamp);
+                CREATE INDEX IF NOT EXISTS messages_user_id ON messages(user, id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    user TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (user, key)
+                );
+            """)
+            _connections[key] = (connection, threading.RLock())
+        return _connections[key]
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # Message.timestamp format, sorts the same as time
+
+# One user's history inside a shared SQLite database
+class SQLiteStorage(HistoryStorage):
+    """
+    Every user's messages live in one `messages` table, indexed on (user, timestamp)
+    for time range queries and on (user, id) so the recent window is a single
+    `ORDER BY id DESC LIMIT n` index scan. The database runs in WAL mode, and bulk
+    writes (migration, rewrites, append_many) are one executemany in one transaction.
+    The cursor is the number of stored records, and side data lives in the `meta` table.
+    """
+
+    BATCH_SIZE = 500  # Records inserted per executemany when importing
+
+    def __init__(self, db_file: str, user: str = "default", legacy_file: Optional[str] = None):
+        self.db_file = db_file  # Path to the SQLite database shared by all users
+        self.user = user  # Whose history this is
+        self.legacy_file = legacy_file  # Optional JSON array or JSONL journal imported on first use
+        self.connection, self.lock = _connect(db_file)
+
+    @staticmethod
+    def _row(record: Dict) -> Tuple:
+        return (record.get("timestamp", ""), record.get("role", ""), _dumps(record))
+
+    def prepare(self):
+        # Imports the legacy history into the database if this user has no messages yet
+        if self.legacy_file and os.path.exists(self.legacy_file) and self.count() == 0:
+            if self.legacy_file.endswith(".jsonl"):
+                journal = JournalStorage(self.legacy_file)
+                self.append_many(journal.iter_records())
+                summary = journal.load_meta("summary")
+                if summary:
+                    self.save_meta("summary", summary)  # The search index is rebuilt from the rows
+                journal.clear()  # The database is now the source of truth
+                for key in ("summary", "index"):
+                    journal.delete_meta(key)
+            else:
+                try:
+                    with open(self.legacy_file, 'r') as f:
+                        records = json.load(f)
+                except json.JSONDecodeError:
+                    print("Warning: Could not load history file. Starting fresh.")
+                    return
+                self.append_many(records)
+                os.remove(self.legacy_file)  # The database is now the source of truth
+            print(f"Migrated {self.count()} messages from {self.legacy_file} to {self.db_file}.")
+
+    def append(self, record: Dict) -> int:
+        # Inserts one record and returns its row id
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO messages (user, timestamp, role, record) VALUES (?, ?, ?, ?)",
+                (self.user,) + self._row(record))
+        return cursor.lastrowid
+
+    def append_many(self, records: Iterable[Dict]):
+        # Inserts records in batches, each batch in a single transaction
+        batch = []
+        for record in records:
+            batch.append((self.user,) + self._row(record))
+            if len(batch) >= self.BATCH_SIZE:
+                self._insert(batch)
+                batch = []
+        if batch:
+            self._insert(batch)
+
+    def _insert(self, rows: List[Tuple]):
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany(
+                    "INSERT INTO messages (user, timestamp, role, record) VALUES (?, ?, ?, ?)", rows)
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def _fetch(self, sql: str, parameters: Tuple) -> List[Dict]:
+        with self.lock:
+            rows = self.connection.execute(sql, parameters).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM messages WHERE user = ?", (self.user,)).fetchone()[0]
+
+    def cursor(self) -> int:
+        return self.count()
+
+    def read_tail(self, count: int) -> List[Dict]:
+        # The most recent `count` records in one indexed query
+        if count <= 0:
+            return []
+        records = self._fetch("SELECT record FROM messages WHERE user = ? ORDER BY id DESC LIMIT ?", (self.user, count))
+        records.reverse()
+        return records
+
+    def read_range(self, start: int, stop: int) -> List[Dict]:
+        start = max(0, start)
+        if start >= stop:
+            return []
+        return self._fetch("SELECT record FROM messages WHERE user = ? ORDER BY id LIMIT ? OFFSET ?",
+                           (self.user, stop - start, start))
+
+    def iter_records(self, start: int = 0) -> Iterator[Dict]:
+        # Streams the records from position `start` in pages, so the history is never loaded at once
+        last_id = -1
+        if start > 0:
+            with self.lock:
+                row = self.connection.execute("SELECT id FROM messages WHERE user = ? ORDER BY id LIMIT 1 OFFSET ?",
+                                              (self.user, start - 1)).fetchone()
+            if row is None:
+                return
+            last_id = row[0]
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT id, record FROM messages WHERE user = ? AND id > ? ORDER BY id LIMIT ?",
+                    (self.user, last_id, self.BATCH_SIZE)).fetchall()
+            for _, record in rows:
+                yield json.loads(record)
+            if len(rows) < self.BATCH_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def query(self, start: Optional[Union[str, datetime.datetime]] = None,
+              end: Optional[Union[str, datetime.datetime]] = None,
+              role: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Returns this user's records with start <= timestamp < end, optionally only one role,
+        oldest first. Runs on the (user, timestamp) index instead of loading the history.
+        """
+        clauses, parameters = ["user = ?"], [self.user]
+        for bound, operator in ((start, ">="), (end, "<")):
+            if bound is not None:
+                if isinstance(bound, datetime.datetime):
+                    bound = bound.strftime(TIMESTAMP_FORMAT)
+                clauses.append(f"timestamp {operator} ?")
+                parameters.append(bound)
+        if role is not None:
+            clauses.append("role = ?")
+            parameters.append(role)
+        sql = f"SELECT record FROM messages WHERE {' AND '.join(clauses)} ORDER BY timestamp, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        return self._fetch(sql, tuple(parameters))
+
+    def users(self) -> List[str]:
+        # Everyone who has a history in this database
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT DISTINCT user FROM messages ORDER BY user")]
+
+    def rewrite(self, records: Iterable[Dict]):
+        # Replaces this user's messages in a single transaction
+        rows = [(self.user,) + self._row(record) for record in records]
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.execute("DELETE FROM messages WHERE user = ?", (self.user,))
+                self.connection.executemany(
+                    "INSERT INTO messages (user, timestamp, role, record) VALUES (?, ?, ?, ?)", rows)
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def load_meta(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE user = ? AND key = ?",
+                                          (self.user, key)).fetchone()
+        return row[0] if row else None
+
+    def save_meta(self, key: str, value: str):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO meta (user, key, value) VALUES (?, ?, ?)",
+                                    (self.user, key, value))
+
+    def sync(self):
+        # With synchronous=NORMAL commits are only fsynced at checkpoints, so checkpoint now
+        with self.lock:
+            self.connection.execute("PRAGMA wal_checkpoint(FULL)")
+
+    def delete_meta(self, key: str):
+        with self.lock:
+            self.connection.execute("DELETE FROM meta WHERE user = ? AND key = ?", (self.user, key))
+
+    def clear(self):
+        # Deletes this user's messages (other users and side data are untouched)
+        with self.lock:
+            self.connection.execute("DELETE FROM messages WHERE user = ?", (self.user,))
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            os.remove(self.legacy_file)
+
+# Background thread that performs the queued writes of every WriteBehindStorage in the process
+class _WriteBehindWriter:
+    POLL_INTERVAL = 0.05  # Seconds between checks for due fsyncs while data is unsynced
+
+    def __init__(self):
+        self.dirty: List["WriteBehindStorage"] = []  # Storages with queued records, in order
+        self.storages = weakref.WeakSet()  # Every live storage, flushed at exit
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.flush_all)
+
+    def notify(self, storage: "WriteBehindStorage"):
+        with self.condition:
+            if storage not in self.dirty:
+                self.dirty.append(storage)
+            self.condition.notify()
+
+    def _due(self, now: float) -> List["WriteBehindStorage"]:
+        # Dirty storages that are not backing off after a failed write; called with the condition held
+        return [storage for storage in self.dirty if storage.retry_at <= now]
+
+    def _run(self):
+        while True:
+            with self.condition:
+                batch = self._due(time.monotonic())
+                if not batch:
+                    now = time.monotonic()
+                    timeouts = [storage.retry_at - now for storage in self.dirty]  # Next retry of a failed storage
+                    if any(storage.unsynced for storage in list(self.storages)):
+                        timeouts.append(self.POLL_INTERVAL)
+                    self.condition.wait(min(timeouts) if timeouts else None)
+                    batch = self._due(time.monotonic())
+                self.dirty = [storage for storage in self.dirty if storage not in batch]
+            for storage in batch:  # Group commit: everything queued since the last pass in one write
+                if not storage.write_pending():
+                    self.notify(storage)  # Retried after this storage's backoff; others keep being written
+            for storage in list(self.storages):
+                try:
+                    storage.sync_if_due()
+                except Exception as e:
+                    print(f"Warning: Could not sync the conversation history: {e}")
+
+    def flush_all(self):
+        # Exit hook: writes and fsyncs every queue before the interpreter stops
+        for storage in list(self.storages):
+            try:
+                storage.close()
+            except Exception as e:
+                print(f"Warning: Could not flush the conversation history: {e}")
+
+_writer: Optional[_WriteBehindWriter] = None
+_writer_lock = threading.Lock()
+
+def _get_writer() -> _WriteBehindWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _WriteBehindWriter()
+    return _writer
+
+# Takes history writes off the response path
+class WriteBehindStorage(HistoryStorage):
+    """
+    Wraps another backend: append() only queues the record in memory and returns, and a
+    shared background writer thread writes everything queued so far with a single
+    append_many (group commit). Reads see queued records as if they were already stored.
+
+    Durability depends on `fsync`:
+      "always"   - every group write is fsynced before the next one starts
+      "interval" - data is fsynced at most `fsync_interval_ms` after it was written
+      "shutdown" - only close() (and the exit hook) fsyncs
+    In every mode a record reaches the operating system within one writer pass (usually
+    well under a millisecond) and survives a crash of this process from then on; flush()
+    and close() return only once everything appended before them is on disk, and raise
+    OSError when it could not be written. The exit hook runs close() for every storage on
+    a normal interpreter exit. After a failed write the writer retries this storage with
+    a growing delay (up to MAX_RETRY_DELAY) without holding up the others.
+    """
+
+    FSYNC_POLICIES = ("always", "interval", "shutdown")
+    MAX_RETRY_DELAY = 5.0  # Longest wait between write attempts after failures, in seconds
+
+    def __init__(self, inner: HistoryStorage, fsync: str = "interval", fsync_interval_ms: float = 1000):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync!r} (expected one of {', '.join(self.FSYNC_POLICIES)})")
+        self.inner = inner  # Backend the records are eventually written to
+        self.fsync = fsync  # When written records are forced to disk
+        self.fsync_interval = fsync_interval_ms / 1000  # Longest time written data stays unsynced ("interval")
+        self.pending: List[Dict] = []  # Records appended but not yet written, oldest first
+        self.pending_lock = threading.Lock()  # Held only briefly, so append() never waits for the disk
+        self.io_lock = threading.RLock()  # Held while writing; readers take it to see a consistent state
+        self.unsynced = False  # Written data waiting for an fsync
+        self.last_sync = time.monotonic()
+        self.failures = 0  # Consecutive failed writes
+        self.retry_at = 0.0  # The writer leaves this storage alone until then (after a failure)
+        self.last_error: Optional[Exception] = None  # Cause of the latest failed write
+        self.writer = _get_writer()
+        self.writer.storages.add(self)
+
+    def prepare(self):
+        self.inner.prepare()
+
+    def warm(self):
+        self.inner.warm()  # The backend locks itself, queued writes don't have to wait
+
+    def append(self, record: Dict):
+        # Queues the record and returns immediately
+        with self.pending_lock:
+            self.pending.append(record)
+        self.writer.notify(self)
+
+    def append_many(self, records: Iterable[Dict]):
+        with self.pending_lock:
+            self.pending.extend(records)
+        self.writer.notify(self)
+
+    def write_pending(self) -> bool:
+        # Writes everything queued so far in one batch; False if the write failed (records stay queued)
+        with self.io_lock:
+            with self.pending_lock:
+                batch = list(self.pending)
+            if not batch:
+                return True
+            try:
+                with span("history_write"):
+                    self.inner.append_many(batch)
+            except Exception as e:
+                print(f"Warning: Could not write the conversation history, will retry: {e}")
+                self.failures += 1
+                self.retry_at = time.monotonic() + min(self.MAX_RETRY_DELAY, 0.1 * 2 ** self.failures)
+                self.last_error = e
+                return False
+            self.failures, self.retry_at, self.last_error = 0, 0.0, None
+            with self.pending_lock:
+                del self.pending[:len(batch)]  # Records appended meanwhile stay queued
+            self.unsynced = True
+            if self.fsync == "always":
+                self._sync()
+        return True
+
+    def _sync(self):
+        self.inner.sync()
+        self.unsynced = False
+        self.last_sync = time.monotonic()
+
+    def sync_if_due(self):
+        # Called by the writer: fsyncs once the interval policy says the data has waited long enough
+        if self.unsynced and self.fsync == "interval" and time.monotonic() - self.last_sync >= self.fsync_interval:
+            with self.io_lock:
+                self._sync()
+
+    def sync(self):
+        with self.io_lock:
+            self._sync()
+
+    def flush(self):
+        # Writes the queue from the calling thread and fsyncs it; OSError if the queue could not be written
+        with self.io_lock:
+            if not self.write_pending():
+                with self.pending_lock:
+                    queued = len(self.pending)
+                raise OSError(f"{queued} history records could not be written and are still queued: "
+                              f"{self.last_error}") from self.last_error
+            self._sync()
+
+    def close(self):
+        self.flush()
+
+    def count(self) -> int:
+        with self.io_lock:
+            with self.pending_lock:
+                queued = len(self.pending)
+            return self.inner.count() + queued
+
+    def read_tail(self, count: int) -> List[Dict]:
+        with self.io_lock:
+            with self.pending_lock:
+                queued = self.pending[-count:] if count > 0 else []
+            return self.inner.read_tail(count - len(queued)) + queued
+
+    def read_range(self, start: int, stop: int) -> List[Dict]:
+        with self.io_lock:
+            with self.pending_lock:
+                queued = list(self.pending)
+            stored = self.inner.count()
+            records = self.inner.read_range(start, min(stop, stored)) if start < stored else []
+            return records + queued[max(0, start - stored):max(0, stop - stored)]
+
+    def iter_records(self, start: int = 0) -> Iterator[Dict]:
+        # Cursors belong to the backend, so the queue is written out first
+        with self.io_lock:
+            self.write_pending()
+        return self.inner.iter_records(start)
+
+    def cursor(self) -> int:
+        with self.io_lock:
+            self.write_pending()
+            return self.inner.cursor()
+
+    def rewrite(self, records: Iterable[Dict]):
+        with self.io_lock:
+            self.write_pending()  # The new records may be read back from this storage
+            self.inner.rewrite(records)
+
+    def clear(self):
+        with self.io_lock:
+            with self.pending_lock:
+                self.pending.clear()
+            self.inner.clear()
+
+    def load_meta(self, key: str) -> Optional[str]:
+        return self.inner.load_meta(key)
+
+    def save_meta(self, key: str, value: str):
+        self.inner.save_meta(key, value)
+
+    def delete_meta(self, key: str):
+        self.inner.delete_meta(key)
+
+def open_storage(backend: str = "jsonl", path: Optional[str] = None, user: str = "default",
+                 legacy_file: Optional[str] = None) -> HistoryStorage:
+    """
+    Creates a history backend by name: "jsonl" (one journal file per history, the default)
+    or "sqlite" (one database holding every user's history).
+    """
+    if backend == "jsonl":
+        return JournalStorage(path or "conversation_history.jsonl", legacy_file=legacy_file)
+    if backend == "sqlite":
+        return SQLiteStorage(path or "conversation_history.db", user=user, legacy_file=legacy_file)
+    raise ValueError(f"Unknown history backend: {backend!r} (expected 'jsonl' or 'sqlite')")
+
+
+# Read-only-on-demand view over the stored history, used as ConversationHistory.messages
+class LazyRecordList:
+    """
+    Behaves like the list of messages, but only the most recent `window` records are
+    loaded at startup (one read_tail call on the backend). Older records are
+    materialized from storage when they are indexed, iterated over or exported, and are
+    not kept in memory afterwards.
+    """
+
+    def __init__(self, storage: HistoryStorage, factory: Callable[[Dict], Any], window: int = 50):
+        self.storage = storage  # Backend the records live in
+        self.factory = factory  # Turns a stored record into an in-memory object (e.g. Message)
+        self.window = window  # How many recent records to keep materialized
+        self._recent = [factory(r) for r in storage.read_tail(window + 1)]  # Recent records
+        self._complete = len(self._recent) <= window  # True when the whole history is in _recent
+        if not self._complete:
+            self._recent = self._recent[1:]
+
+    def append(self, item: Any):
+        # Tracks a record that was just stored
+        self._recent.append(item)
+        if len(self._recent) > self.window:
+            del self._recent[0]  # Keep only the recent window resident
+            self._complete = False
+
+    def __len__(self) -> int:
+        if self._complete:
+            return len(self._recent)
+        return self.storage.count()
+
+    def __bool__(self) -> bool:
+        return bool(self._recent)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if self._complete:
+                return self._recent[key]
+            start, stop, step = key.start, key.stop, key.step
+            # Fast path: a tail slice such as [-10:] that fits in the resident window
+            if stop is None and step in (None, 1) and start is not None and -len(self._recent) <= start < 0:
+                return self._recent[start:]
+            start, stop, step = key.indices(len(self))
+            if step != 1 or start >= stop:
+                return [self[i] for i in range(start, stop, step)]
+            return [self.factory(r) for r in self.storage.read_range(start, stop)]
+        if self._complete:
+            return self._recent[key]
+        if -len(self._recent) <= key < 0:
+            return self._recent[key]
+        total = len(self)
+        if key < 0:
+            key += total
+        if not 0 <= key < total:
+            raise IndexError("history index out of range")
+        if key >= total - len(self._recent):
+            return self._recent[key - total]
+        return self.factory(self.storage.read_range(key, key + 1)[0])
+
+    def read_range(self, start: int, stop: int) -> List[Any]:
+        # Items at positions start..stop-1, always read from storage; positions never move, so this
+        # is safe while other threads append (unlike slicing the resident window)
+        return [self.factory(r) for r in self.storage.read_range(start, stop)]
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._complete:
+            return iter(list(self._recent))
+        return (self.factory(r) for r in self.storage.iter_records())
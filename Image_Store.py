@@ -0,0 +1,98 @@
+# Content-addressed store of image attachments for the vision model
+# An attached image is decoded and downscaled once, saved under the hash of the original bytes,
+# and referenced from the history by that hash. The base64 payload sent to the model is encoded
+# once and kept in a size-bounded cache, so later turns reuse it instead of re-encoding.
+import io  # Encodes the downscaled image in memory
+import os  # Cache directory and atomic writes
+import base64  # Data URLs for the inference API
+import hashlib  # Content addresses
+import threading  # The store is shared by all sessions
+from collections import OrderedDict  # Least recently used payloads
+from typing import Dict, Optional  # For type hinting
+from Resources import shared  # One store per process
+from Metrics import span  # Time spent preparing images
+
+# Caches downscaled images on disk and their encoded payloads in memory
+class ImageStore:
+    """
+    add(data) stores an uploaded image and returns the content part to keep in the history,
+    {"type": "image", "hash": ..., "width": ..., "height": ...}. Images are scaled to fit
+    `max_side` pixels and re-encoded as JPEG; adding the same bytes again only checks that
+    the file exists. data_url(hash) returns the payload for the API, from a cache of at most
+    `max_cache_mb` megabytes, or None when the image is no longer on disk.
+    """
+
+    def __init__(self, directory: str = "image_cache", max_side: int = 1024, quality: int = 85,
+                 max_cache_mb: float = 64.0):
+        self.directory = directory  # Where downscaled images are kept, one file per hash
+        self.max_side = max_side  # Longest side after downscaling, in pixels
+        self.quality = quality  # JPEG quality of the stored images
+        self.max_cache_bytes = int(max_cache_mb * 1024 * 1024)  # Bound on cached payloads
+        self.payloads: "OrderedDict[str, str]" = OrderedDict()  # hash -> data URL, least recent first
+        self.cached_bytes = 0  # Total size of the cached payloads
+        self.lock = threading.Lock()  # Guards the payload cache
+        self.hits = self.misses = 0  # Payload cache statistics
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    def add(self, data: bytes) -> Dict:
+        # Stores an image (any format Pillow reads) and returns its history content part
+        from PIL import Image, ImageOps  # Optional dependency, only needed once images are attached
+
+        key = hashlib.sha256(data).hexdigest()[:32]
+        path = self.path(key)
+        if os.path.exists(path):
+            with Image.open(path) as image:  # Reads the header only
+                return {"type": "image", "hash": key, "width": image.width, "height": image.height}
+
+        with span("image_prepare"):
+            try:
+                image = Image.open(io.BytesIO(data))
+                image.draft("RGB", (self.max_side, self.max_side))  # JPEGs decode at a reduced scale directly
+                image = ImageOps.exif_transpose(image)  # Phone photos: apply the rotation before resizing
+            except (OSError, SyntaxError) as e:
+                raise ValueError(f"Not a readable image: {e}") from e
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((self.max_side, self.max_side))
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_path, path)  # Readers never see a partial file
+        return {"type": "image", "hash": key, "width": image.width, "height": image.height}
+
+    def data_url(self, key: str) -> Optional[str]:
+        # The image as a base64 data URL, encoded once and reused while it stays cached
+        with self.lock:
+            url = self.payloads.get(key)
+            if url is not None:
+                self.payloads.move_to_end(key)
+                self.hits += 1
+                return url
+            self.misses += 1
+        try:
+            with open(self.path(key), "rb") as f:
+                url = "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+        except FileNotFoundError:
+            return None  # Removed from the cache directory; the history keeps a placeholder
+        with self.lock:
+            if key not in self.payloads:
+                self.payloads[key] = url
+                self.cached_bytes += len(url)
+                while self.cached_bytes > self.max_cache_bytes and len(self.payloads) > 1:
+                    _, evicted = self.payloads.popitem(last=False)
+                    self.cached_bytes -= len(evicted)
+        return url
+
+def get_image_store() -> ImageStore:
+    # The process-wide image store, configured from the environment
+    return shared("image_store", lambda: ImageStore(
+        directory=os.getenv("IMAGE_CACHE_DIR", "image_cache"),
+        max_side=int(os.getenv("IMAGE_MAX_SIDE", "1024")),
+        max_cache_mb=float(os.getenv("IMAGE_CACHE_MB", "64")),
+    ))
@@ -3,86 +3,616 @@
 import os  # Provides functionalities for interacting with the operating system
 import json  # For handling JSON data
 import asyncio  # Supports asynchronous programming
-import datetime  # For working with dates and times
+import re  # Regular expressions for token estimation
+import sys  # Interns message roles
+import functools  # Caches timestamp parsing per hour
+import hashlib  # Names shared clients without exposing the API key
+import time  # For measuring startup and per-turn timings
 import argparse  # To parse command-line arguments
-import readline  # Improves terminal input handling by enabling line editing and history
+import threading  # Locks shared with the background summarizer
+import weakref  # Per-event-loop async clients and semaphores
 from dotenv import load_dotenv  # Loads environment variables from a .env file
-from Speech_to_text import main_stt  # Placeholder for a custom speech-to-text function/module
-from typing import List, Dict, Union  # For type hinting complex data structures
-from dataclasses import dataclass, asdict  # Simplifies class creation and serialization
-from huggingface_hub import InferenceClient  # Used to interact with Hugging Face's inference API
-from deprecated.txt_animation_function import print_animated_txt  # Placeholder for a custom text animation function
-
-# Define a data class for individual messages
-@dataclass
+from typing import Awaitable, Callable, List, Dict, Union, Iterator, AsyncIterator, Iterable, Optional, Sequence, Tuple, TypeVar  # For type hinting complex data structures
+from concurrent.futures import ThreadPoolExecutor, Future  # Background summarization worker
+from huggingface_hub import InferenceClient, AsyncInferenceClient  # Used to interact with Hugging Face's inference API
+from History_Storage import TIMESTAMP_FORMAT, HistoryStorage, JournalStorage, WriteBehindStorage, LazyRecordList, open_storage  # History backends (JSONL journal, SQLite)
+from Retrieval_Index import BM25Index  # Search index over past messages
+from Metrics import span, observe, configure_from_env  # Per-stage latency tracing
+from Resources import shared  # Process-wide clients, built once and reused by every ChatBot
+from Resilience import ResilientRequester, RetryPolicy, status_code, retry_after  # Retries, hedging and model fallback
+from Scheduler import RequestCancelled, RequestScheduler, request_scheduler  # Fair sharing of the provider's rate limit
+from Image_Store import get_image_store  # Downscaled image attachments, referenced by hash
+
+T = TypeVar("T")
+
+def user_message_content(user_input: str, emotion: Optional[Dict] = None, images: Sequence[Dict] = ()) -> List[Dict]:
+    # Builds the structured content of a user message, with attached images and the detected voice emotion if any
+    content = list(images)  # Image parts reference the image store by hash
+    if user_input or not content:
+        content.append({"type": "text", "text": user_input})
+    if emotion:
+        content.append({"type": "emotion", "emotion": emotion["emotion"], "confidence": emotion["confidence"]})
+    return content
+
+IMAGE_PLACEHOLDER = "[Image shared earlier]"  # Stands in for an image that is not sent again
+
+def api_content(content: Union[str, List[Dict]],
+                image_url: Optional[Callable[[str], Optional[str]]] = None) -> List[Dict]:
+    # Converts stored message content into parts the inference API accepts; image_url(hash) returns
+    # the payload of an image to send, or None to describe it in words (the default for every image)
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    parts = []
+    for part in content:
+        kind = part.get("type")
+        if kind == "emotion":  # Not an API part type, describe it in words instead
+            parts.append({"type": "text", "text": f"[Voice tone: {part['emotion']}, confidence {part['confidence']:.0%}]"})
+        elif kind == "image":  # Stored by hash, see Image_Store.py
+            url = image_url(part["hash"]) if image_url is not None else None
+            if url is not None:
+                parts.append({"type": "image_url", "image_url": {"url": url}})
+            else:
+                parts.append({"type": "text", "text": IMAGE_PLACEHOLDER})
+        else:
+            parts.append(part)
+    return parts
+
+_loop_local_lock = threading.Lock()  # Guards the per-loop caches below
+
+def loop_local(cache: Dict[int, Tuple["weakref.ref", object]], factory: Callable[[], T]) -> T:
+    # Returns the running event loop's entry in `cache`, created by factory() on first use.
+    # Clients and semaphores are bound to the loop they were first used on, so each loop gets
+    # its own; entries of closed loops are dropped when a new loop shows up.
+    loop = asyncio.get_running_loop()
+    with _loop_local_lock:
+        entry = cache.get(id(loop))
+        if entry is not None and entry[0]() is loop:
+            return entry[1]
+        for key, (ref, _) in list(cache.items()):
+            old = ref()
+            if old is None or old.is_closed():
+                del cache[key]
+        value = factory()
+        cache[id(loop)] = (weakref.ref(loop), value)
+        return value
+
+# Async inference client that keeps one underlying client per event loop
+class LoopLocalClient:
+    """
+    An AsyncInferenceClient is bound to the event loop that first used it, so a second
+    asyncio.run() in the same process can't reuse it. This wrapper hands out a separate
+    client for each running loop and forwards attribute access, so
+    `client.chat.completions.create(...)` works as usual.
+    """
+
+    def __init__(self, factory: Callable[[], AsyncInferenceClient]):
+        self.factory = factory  # Builds the client for a new loop
+        self.clients: Dict[int, Tuple["weakref.ref", AsyncInferenceClient]] = {}  # id(loop) -> (loop, client)
+
+    def current(self) -> AsyncInferenceClient:
+        # The client of the running event loop
+        return loop_local(self.clients, self.factory)
+
+    def __getattr__(self, name: str):
+        return getattr(self.current(), name)
+
+def inference_client(token: str, asynchronous: bool = False, base_url: Optional[str] = None,
+                     timeout: Optional[float] = None):
+    # Returns the process-wide (async) inference client for an API key, endpoint and timeout, creating it on first use
+    # (async clients are a LoopLocalClient, so every event loop gets its own connections)
+    name = f"{'async_' if asynchronous else ''}inference_client:{hashlib.sha256(token.encode()).hexdigest()[:12]}"
+    if base_url:
+        name += f"@{base_url}"
+    if timeout:
+        name += f"/timeout={timeout}"
+    if asynchronous:
+        return shared(name, lambda: LoopLocalClient(
+            lambda: AsyncInferenceClient(api_key=token, base_url=base_url, timeout=timeout)))
+    return shared(name, lambda: InferenceClient(api_key=token, base_url=base_url, timeout=timeout))  # The key never appears in the registry
+
+# Rough token count for prompt budgeting, close to Llama's tokenizer for English text
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")  # Words and individual punctuation marks
+MESSAGE_OVERHEAD_TOKENS = 4  # Role header and separators the chat template adds per message
+
+def content_text(content: Union[str, List[Dict]]) -> str:
+    # Returns what was actually written in plain or structured message content (no image or tone notes)
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+
+def estimate_tokens(content: Union[str, List[Dict]]) -> int:
+    # Estimates how many prompt tokens a message takes (about 1.3 tokens per word)
+    pieces = len(TOKEN_PATTERN.findall(content_text(content)))
+    return int(pieces * 1.3) + MESSAGE_OVERHEAD_TOKENS
+
+@functools.lru_cache(maxsize=4096)
+def _hour_epoch(hour: str) -> int:
+    # Epoch seconds of a local "YYYY-MM-DD HH" hour; one mktime per distinct hour of history
+    return int(time.mktime(time.strptime(hour, "%Y-%m-%d %H")))
+
+_SECONDS_INTO_HOUR = {f"{m:02d}:{s:02d}": 60 * m + s for m in range(60) for s in range(60)}  # "MM:SS" -> seconds
+
+def parse_timestamp(timestamp: str) -> int:
+    # Epoch seconds of a stored "YYYY-MM-DD HH:MM:SS" local timestamp, without strptime per message
+    try:
+        return _hour_epoch(timestamp[:13]) + _SECONDS_INTO_HOUR[timestamp[14:19]]
+    except (KeyError, ValueError):
+        try:
+            return int(time.mktime(time.strptime(timestamp, TIMESTAMP_FORMAT)))
+        except ValueError:
+            return 0  # Unreadable timestamp: keep the message rather than failing to load the history
+
+_TEXT_PART_KEYS = {"type": None, "text": None}.keys()  # Keys of a plain text content part
+
+# One message of the conversation, compact because every resident session keeps a window of them
 class Message:
-    role: str  # Specifies the role of the message sender (e.g., user or assistant)
-    content: Union[str, List[Dict]]  # Message content, can be plain text or structured
-    timestamp: str  # Timestamp of when the message was created
+    """
+    Stored records ({"role", "content", "timestamp", "token_count"}) are unchanged; in memory
+    a message keeps an interned role, an integer epoch timestamp and, for the common
+    single-text-part content, just the text. Structured content (e.g. with a voice emotion)
+    keeps its parts. The dict sent to the inference API is built on first use and reused
+    on every later turn.
+    """
+
+    __slots__ = ("role", "text", "parts", "created", "token_count", "_api")
+
+    def __init__(self, role: str, content: Union[str, List[Dict]], timestamp: Union[str, int, None] = None,
+                 token_count: Optional[int] = None):
+        self.role = sys.intern(role)  # Every message shares the same few role strings
+        if isinstance(content, str):
+            self.text, self.parts = content, None  # Stored as a plain string
+        elif len(content) == 1 and content[0].keys() == _TEXT_PART_KEYS and content[0]["type"] == "text":
+            self.text, self.parts = content[0]["text"], ()  # A single text part, rebuilt on demand
+        else:
+            self.text, self.parts = content_text(content), content  # Structured content
+        if timestamp is None:
+            self.created = int(time.time())
+        elif isinstance(timestamp, str):
+            self.created = parse_timestamp(timestamp)
+        else:
+            self.created = int(timestamp)
+        self.token_count = token_count if token_count is not None else estimate_tokens(self.text)
+        self._api: Optional[Dict] = None  # Cached API-ready message
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "Message":
+        # A stored record, trusted as written by to_record: no keyword unpacking, no re-validation
+        message = cls.__new__(cls)
+        content = record["content"]
+        if type(content) is str:
+            message.text, message.parts = content, None
+        else:
+            part = content[0] if len(content) == 1 else None
+            if part is not None and len(part) == 2 and part.get("type") == "text":
+                message.text, message.parts = part["text"], ()
+            else:
+                message.text, message.parts = content_text(content), content
+        message.role = sys.intern(record["role"])
+        message.created = parse_timestamp(record["timestamp"])
+        token_count = record.get("token_count")
+        message.token_count = token_count if token_count is not None else estimate_tokens(message.text)
+        message._api = None
+        return message
+
+    @property
+    def content(self) -> Union[str, List[Dict]]:
+        # Content in its stored form
+        if self.parts is None:
+            return self.text
+        if not self.parts:
+            return [{"type": "text", "text": self.text}]
+        return self.parts
+
+    @property
+    def timestamp(self) -> str:
+        return time.strftime(TIMESTAMP_FORMAT, time.localtime(self.created))
+
+    def api_message(self) -> Dict:
+        # {"role", "content"} as the inference API expects it; built once, treat as read-only
+        if self._api is None:
+            content = api_content(self.parts) if self.parts else [{"type": "text", "text": self.text}]
+            self._api = {"role": self.role, "content": content}
+        return self._api
+
+    def to_record(self) -> Dict:
+        # The stored form, as written by earlier versions
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp,
+                "token_count": self.token_count}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self.to_record() == other.to_record()
+
+    __hash__ = None  # Mutable, like the dataclass it replaces
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r}, timestamp={self.timestamp!r})"
+
+def history_loader() -> ThreadPoolExecutor:
+    # Shared thread for the slow parts of opening a history (offset index, search index)
+    return shared("history_loader", lambda: ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-load"))
 
 # Manages the conversation history, including saving/loading messages
 class ConversationHistory:
-    def __init__(self, history_file: str = "conversation_history.json"):        
-        self.history_file = history_file  # Path to the file storing conversation history
-        self.messages: List[Message] = []  # List to store Message objects
+    def __init__(self, history_file: str = "conversation_history.jsonl",
+                 legacy_file: str = "conversation_history.json",
+                 window: int = 50, retrieval: bool = True, storage: Optional[HistoryStorage] = None,
+                 write_behind: bool = True, fsync: str = "interval"):
+        self.history_file = history_file  # Path to the append-only journal storing conversation history
+        # Backend holding the messages: the JSONL journal unless another one (e.g. SQLiteStorage) is given
+        storage = storage if storage is not None else JournalStorage(history_file, legacy_file=legacy_file)
+        if write_behind and not isinstance(storage, WriteBehindStorage):
+            # Writes happen on a background thread, see WriteBehindStorage for the fsync policies
+            storage = WriteBehindStorage(storage, fsync=fsync)
+        self.storage = storage
+        self.window = window  # Number of recent messages kept in memory, older ones stay on disk
+        self.summary = ""  # Summary text of the oldest `summary_covered` messages
+        self.summary_covered = 0  # How many messages (from the start) are folded into the summary
+        self.generation = 0  # Bumped on clear so background work started earlier is discarded
+        self.retrieval = retrieval  # Whether older messages are indexed for recall
+        self.index: Optional[BM25Index] = None  # Search index, None if disabled or not loaded yet
+        self.index_loading: Optional[Future] = None  # Background load of the search index, see search_index()
+        self.lock = threading.RLock()  # Guards messages against the background summarizer
+        self.messages: LazyRecordList  # Lazy view of Message objects, set up by load_history
         self.load_history()  # Load history from the file on initialization
 
+    @staticmethod
+    def _to_message(record: Dict) -> Message:
+        # Deserializes one stored record into a Message
+        return Message.from_record(record)
+
     def add_message(self, role: str, content: Union[str, List[Dict]]):
         # Adds a new message to the history
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Current timestamp
-        message = Message(role=role, content=content, timestamp=timestamp)  # Create a new message
-        self.messages.append(message)  # Add the message to the list
-        self.save_history()  # Save the updated history to the file
+        message = Message(role=role, content=content)  # Create a new message, stamped now
+        with self.lock, span("history_persist"):
+            self.storage.append(message.to_record())  # Append only the new message to the storage
+            self.messages.append(message)  # Add the message to the list
+            if self.index is not None:
+                self.index.add(message.text)  # Document id == position in the history
 
     def load_history(self):
-        # Loads the conversation history from the file
-        if os.path.exists(self.history_file):  # Check if the file exists
+        # Loads the recent window of the conversation history; older messages are read on demand
+        self.storage.prepare()  # Migrate old history files and repair a torn final write
+        self.messages = LazyRecordList(self.storage, self._to_message, self.window)
+        # Byte offsets of older records (journal) are indexed in the background, not on the first turn
+        history_loader().submit(self.storage.warm)
+        summary = self.storage.load_meta("summary")
+        if summary:
             try:
-                with open(self.history_file, 'r') as f:
-                    data = json.load(f)  # Load the JSON data
-                    self.messages = [Message(**msg) for msg in data]  # Deserialize messages
-            except json.JSONDecodeError:
-                print("Warning: Could not load history file. Starting fresh.")  # Handle file corruption
+                data = json.loads(summary)
+                self.summary, self.summary_covered = data["summary"], data["covered"]
+            except (json.JSONDecodeError, KeyError):
+                print("Warning: Could not load summary file. Rebuilding the summary.")
+        if self.retrieval:
+            self.index_loading = history_loader().submit(self.load_index)  # Startup doesn't grow with the history
+
+    def load_index(self):
+        # Loads the search index and indexes any messages stored since it was last saved
+        generation = self.generation
+        index = BM25Index.loads(self.storage.load_meta("index"))  # The slow part, new messages can be added meanwhile
+        with self.lock:
+            if generation != self.generation:
+                return  # Cleared meanwhile, clear_history started a new index
+            if index.cursor > self.storage.cursor():  # Storage was replaced, the saved index no longer matches it
+                index = BM25Index()
+            added = index.extend(content_text(r.get("content", "")) for r in self.storage.iter_records(index.cursor))
+            self.index = index
+            if added:
+                self.save_index()
+
+    def search_index(self) -> Optional[BM25Index]:
+        # The search index, once loaded; the first caller waits for (or takes over) the background load
+        loading = self.index_loading
+        if loading is not None:
+            if loading.cancel():
+                self.load_index()  # Still queued behind other histories, load it here instead
+            else:
+                loading.result()
+            self.index_loading = None
+        return self.index
+
+    def save_index(self):
+        # Persists the search index together with the storage cursor it covers
+        self.index.cursor = self.storage.cursor()
+        self.storage.save_meta("index", self.index.dumps())
+
+    def update_summary(self, summary: str, covered: int, generation: int):
+        # Stores a new running summary, unless the history was cleared since it was started
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.storage.save_meta("summary", json.dumps({"summary": summary, "covered": covered}))
+            self.summary, self.summary_covered = summary, covered
+
+    def flush(self):
+        # Writes queued messages to disk and saves the search index so reloading needs no catch-up
+        if self.index_loading is not None and not self.index_loading.cancelled():
+            self.index_loading.result()  # The loader may save the index as well
+        with self.lock:
+            self.storage.flush()
+            if self.index is not None and self.index.cursor != self.storage.cursor():
+                self.save_index()
+
+    def memory_estimate(self) -> int:
+        # Approximate bytes held in memory: resident message text plus the search index
+        size = sum(len(msg.text) + 200 for msg in self.messages[-self.window:])
+        if self.index is not None:
+            size += self.index.memory_estimate()
+        return size
 
     def save_history(self):
-        # Saves the conversation history to the file
-        with open(self.history_file, 'w') as f:
-            json.dump([asdict(msg) for msg in self.messages], f, indent=2)  # Serialize messages as JSON
+        # Saves the full conversation history to the file
+        self.compact()
+
+    def compact(self):
+        # Rewrites the storage so it holds exactly the stored messages and nothing else
+        self.storage.rewrite(msg.to_record() for msg in self.messages)  # Streams from the journal, never loads everything
+        if self.index is not None:
+            self.save_index()  # Re-anchor the index to the rewritten storage
+
+    def export_history(self, file_path: str):
+        # Exports the whole history as a JSON array, streaming one message at a time
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write("[")
+            for i, msg in enumerate(self.messages):
+                f.write(("," if i else "") + "\n  " + json.dumps(msg.to_record(), ensure_ascii=False))
+            f.write("\n]\n")
 
     def clear_history(self):
         # Clears the conversation history
-        self.messages = []  # Empty the list of messages
-        if os.path.exists(self.history_file):  # Delete the history file if it exists
-            os.remove(self.history_file)
+        with self.lock:
+            self.storage.clear()  # Delete the stored messages
+            for key in ("summary", "index"):
+                self.storage.delete_meta(key)
+            self.messages = LazyRecordList(self.storage, self._to_message, self.window)  # Empty the list of messages
+            self.summary, self.summary_covered = "", 0
+            self.generation += 1
+            if self.retrieval:
+                self.index = BM25Index()
+
+# Folds messages that have left the prompt window into a persisted running summary
+class ConversationSummarizer:
+    """
+    Runs on a single background thread so summarization never delays a response.
+    After each turn, messages older than the prompt window that are not yet summarized
+    are sent to the model together with the current summary, and the updated summary
+    is saved next to the history file.
+    """
+
+    SUMMARY_PROMPT = (
+        "You maintain the memory of an ongoing conversation between a user and an assistant. "
+        "Update the running summary with the new messages below. Keep every detail that matters "
+        "for continuing the conversation (feelings, events, people, decisions, advice given) and "
+        "stay under {words} words.\n\nCurrent summary:\n{summary}\n\nNew messages:\n{messages}"
+    )
+
+    def __init__(self, history: ConversationHistory, client, model_name: str,
+                 min_batch: int = 6, max_batch: int = 40, max_tokens: int = 300,
+                 scheduler: Optional[RequestScheduler] = None, user: str = "default"):
+        self.history = history  # History whose old messages get summarized
+        self.client = client  # Synchronous inference client used from the worker thread
+        self.model_name = model_name  # Model that writes the summary
+        self.scheduler = scheduler or request_scheduler()  # Summaries wait behind interactive turns
+        self.user = user  # Whose rate limit the summary calls count against
+        self.min_batch = min_batch  # Wait until this many messages are pending
+        self.max_batch = max_batch  # Fold at most this many messages per call
+        self.max_tokens = max_tokens  # Length limit of the summary
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self.pending: Optional[Future] = None  # Summarization currently running, if any
+        self.closed = threading.Event()  # Set by close(); a fold still waiting for the scheduler gives up
+
+    def close(self):
+        # Drops a fold that has not started, withdraws one still queued, and waits for one in flight
+        self.closed.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def schedule(self, window_size: int):
+        # Starts a background fold if none is running; returns immediately
+        if self.pending is not None and not self.pending.done():
+            return
+        self.pending = self.executor.submit(self.fold, window_size)
+
+    def fold(self, window_size: int):
+        # Summarizes the next batch of messages that are older than the last `window_size` ones
+        try:
+            with self.history.lock:  # Only a snapshot; reading storage here would hold up the next turn
+                generation = self.history.generation
+                start = self.history.summary_covered
+                summary = self.history.summary
+                messages = self.history.messages
+
+            # May build the journal's offset index; the storage serializes this with the writes
+            stop = min(len(messages) - window_size, start + self.max_batch)
+            if stop - start < self.min_batch:
+                return
+            batch = messages.read_range(start, stop)
+
+            transcript = "\n".join(f"{msg.role}: {msg.text}" for msg in batch)
+            prompt = self.SUMMARY_PROMPT.format(
+                words=int(self.max_tokens * 0.6), summary=summary or "(empty)", messages=transcript
+            )
+            self.scheduler.acquire(self.user, "batch", cancel=self.closed)
+            completion = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+                max_tokens=self.max_tokens
+            )
+            new_summary = completion.choices[0].message.content.strip()
+            self.history.update_summary(new_summary, stop, generation)
+        except RequestCancelled:
+            pass  # Closed before the scheduler admitted the summary; the next session picks it up
+        except Exception as e:
+            print(f"Warning: Could not update the conversation summary: {e}")  # Retried after the next turn
 
 # Represents the chatbot and its operations
 class ChatBot:
-    def __init__(self, model_name: str = "meta-llama/Llama-3.2-11B-Vision-Instruct"):
-        load_dotenv()  # Load environment variables from .env file
+    def __init__(self, model_name: str = "meta-llama/Llama-3.2-11B-Vision-Instruct",
+                 history: Optional[ConversationHistory] = None, context_token_budget: int = 3000,
+                 summarize: bool = True, retrieval_k: int = 3, retrieval_token_budget: int = 400,
+                 personality_file: Optional[str] = "personality.txt", base_url: Optional[str] = None,
+                 fallback_models: Optional[Sequence[str]] = None, retry_policy: Optional[RetryPolicy] = None,
+                 user: str = "default", priority: str = "interactive", scheduler: Optional[RequestScheduler] = None,
+                 max_prompt_images: int = 1):
+        shared("dotenv", load_dotenv)  # Load environment variables from .env file (once per process)
+        # OpenAI-compatible endpoint to use instead of Hugging Face (e.g. Local_Inference_Server.py)
+        self.base_url = base_url or os.getenv("INFERENCE_BASE_URL") or None
         self.token = os.getenv("HF_API_KEY")  # Get the API key from environment variables
+        if not self.token and self.base_url:
+            self.token = "local"  # Local endpoints don't check the key
         if not self.token:
             raise ValueError("API key not found. Please set HF_API_KEY in your .env file.")  # Error if key missing
 
         self.model_name = model_name  # Name of the model to be used
-        self.client = InferenceClient(api_key=self.token)  # Initialize Hugging Face inference client
-        self.history = ConversationHistory()  # Initialize conversation history manager
-        self.personality = self.load_personality("personality.txt")  # Load chatbot personality from file
+        if fallback_models is None:  # Comma-separated alternates from the environment
+            fallback_models = [m.strip() for m in os.getenv("INFERENCE_FALLBACK_MODELS", "").split(",") if m.strip()]
+        if retry_policy is None:
+            retry_policy = RetryPolicy(hedge=os.getenv("INFERENCE_HEDGE", "").lower() in ("1", "true", "on"))
+        self.retry_policy = retry_policy  # Retries, timeouts and hedging of model calls
+        self.requester = ResilientRequester([model_name, *fallback_models], retry_policy)  # Primary, then fallbacks
+        self.user = user  # Whose rate limit this chatbot's requests count against
+        self.priority = priority  # "interactive" turns are admitted before "batch" ones
+        self.scheduler = scheduler or request_scheduler()  # Admits model calls across all sessions
+        self.client = self.create_client()  # Initialize Hugging Face inference client
+        self.history = history if history is not None else ConversationHistory()  # Initialize conversation history manager
+        self.context_token_budget = context_token_budget  # Prompt tokens for the personality plus history
+        self.retrieval_k = retrieval_k  # Relevant older messages to recall per turn (0 disables)
+        self.retrieval_token_budget = retrieval_token_budget  # Part of the budget reserved for recalled messages
+        self.images = get_image_store()  # Attached images, shared by all sessions
+        self.max_prompt_images = max_prompt_images  # Images of earlier turns sent per prompt; the new turn's are always sent
+        self.personality_file = personality_file  # Shared personality file, None keeps it in this history
+        self.personality = self.load_personality(personality_file or "personality.txt")  # Load chatbot personality
+        self.personality_tokens = estimate_tokens(self.personality)  # Cached, the personality rarely changes
+        self.last_context_size = 0  # Number of history messages sent in the latest prompt
+        self._summary_tokens_for, self._summary_tokens = "", 0  # Token count cache for the summary
+        self.summarizer = None  # Background memory compaction of messages outside the window
+        if summarize:
+            summary_client = inference_client(self.token, base_url=self.base_url, timeout=retry_policy.request_timeout)
+            self.summarizer = ConversationSummarizer(self.history, summary_client, model_name,
+                                                     scheduler=self.scheduler, user=user)
+
+    def create_client(self):
+        # Returns the process-wide inference client for this API key, creating it on first use
+        return inference_client(self.token, base_url=self.base_url, timeout=self.retry_policy.request_timeout)
+
+    def admit(self):
+        # Waits until the scheduler lets this session send a request (before every attempt)
+        self.scheduler.acquire(self.user, self.priority)
+
+    def try_admit(self) -> bool:
+        # Takes a scheduler slot only if one is free right now (for hedged requests)
+        return self.scheduler.try_acquire(self.user, self.priority)
+
+    def scheduled(self, create: Callable[[str], T]) -> Callable[[str], T]:
+        # Wraps a model call so a 429 slows down every session, not just this one
+        def request(model: str) -> T:
+            try:
+                return create(model)
+            except Exception as e:
+                if status_code(e) == 429:
+                    self.scheduler.throttle(retry_after(e))  # Everyone backs off, not just this turn
+                raise
+        return request
 
     def load_personality(self, file_path: str) -> str:
-        # Loads the chatbot's personality from a file
+        # Loads the chatbot's personality from the history (per-user) or from a file
+        if self.personality_file is None:
+            stored = self.history.storage.load_meta("personality")
+            if stored:
+                return stored  # Falls back to the shared file until this user sets their own
         if os.path.exists(file_path):  # Check if the personality file exists
             with open(file_path, 'r') as f:
                 return f.read().strip()  # Read and return the personality text
         return "You are a helpful assistant. Answer questions clearly and concisely."  # Default personality
 
     def update_personality(self, new_personality: str):
-        # Updates the chatbot's personality and saves it to a file
-        with open("personality.txt", 'w') as f:
-            f.write(new_personality)  # Save the new personality text to file
+        # Updates the chatbot's personality and saves it to its file (or to the history when per-user)
+        if self.personality_file is None:
+            self.history.storage.save_meta("personality", new_personality)
+        else:
+            with open(self.personality_file, 'w') as f:
+                f.write(new_personality)  # Save the new personality text to file
         self.personality = new_personality  # Update the in-memory personality
+        self.personality_tokens = estimate_tokens(new_personality)  # Refresh the cached token count
 
-    def format_conversation(self) -> List[Dict]:
-        # Formats the conversation history for sending to the inference API
+    def summary_tokens(self) -> int:
+        # Prompt tokens taken by the running summary (cached per summary text)
+        if not self.history.summary:
+            return 0
+        if self._summary_tokens_for != self.history.summary:
+            self._summary_tokens_for = self.history.summary
+            self._summary_tokens = estimate_tokens(self.history.summary)
+        return self._summary_tokens
+
+    def close(self):
+        # Stops background summarization (a summary still queued is left for next time) and persists everything
+        if self.summarizer is not None:
+            self.summarizer.close()
+            self.summarizer = None
+        self.history.flush()
+
+    def compact_memory(self):
+        # Hands messages that fell out of the prompt window to the background summarizer
+        if self.summarizer is not None:
+            self.summarizer.schedule(self.last_context_size)
+
+    def select_context(self, pending: Optional[Message] = None) -> List[Message]:
+        # Picks the most recent messages whose cached token counts fit in the context budget,
+        # ending with `pending` (the new user message, not stored until the turn succeeds)
+        budget = self.context_token_budget - self.personality_tokens - self.summary_tokens()
+        if self.retrieval_k and self.history.retrieval:
+            budget -= self.retrieval_token_budget  # Leave room for recalled messages
+        selected = []
+        candidates = self.history.messages[-self.history.window:]  # Only the resident window
+        if pending is not None:
+            candidates = candidates + [pending]
+        for msg in reversed(candidates):
+            if selected and msg.token_count > budget:  # The newest message is always sent
+                break
+            selected.append(msg)
+            budget -= msg.token_count
+        selected.reverse()  # Back to chronological order
+        self.last_context_size = len(selected)  # The summarizer folds what is older than this
+        return self.unsummarized_before(selected, pending) + selected
+
+    def unsummarized_before(self, selected: List[Message], pending: Optional[Message] = None) -> List[Message]:
+        # Messages older than the selected context that the summary doesn't cover yet. The summarizer
+        # waits until `min_batch` of them have piled up, so up to min_batch-1 are sent as they are
+        # rather than being left out of both; a larger backlog is being summarized already
+        if self.summarizer is None:
+            return []
+        stored = len(selected) - (1 if pending is not None else 0)  # Selected messages that are in the history
+        resident = self.history.messages[-self.history.window:]
+        if stored == len(resident) < self.history.window:
+            return []  # The whole history was selected
+        first = len(self.history.messages) - stored  # Position of the oldest selected message
+        gap = first - self.history.summary_covered
+        if not 0 < gap < self.summarizer.min_batch:
+            return []
+        left_out = resident[:len(resident) - stored]
+        if gap <= len(left_out):
+            return left_out[len(left_out) - gap:]
+        return self.history.messages[first - gap:first]
+
+    def recall_messages(self, context: List[Message], pending: Optional[Message] = None) -> List[Message]:
+        # Finds older messages, outside the recent context, that are relevant to the latest user message
+        index = self.history.search_index() if self.retrieval_k else None
+        if index is None or not context or context[-1].role != "user":
+            return []
+        stored = len(context) - (1 if pending is not None else 0)  # Context messages that are in the index
+        hits = index.search(context[-1].text, k=self.retrieval_k,
+                            exclude_from=index.count - stored)
+        recalled, budget = [], self.retrieval_token_budget
+        for doc_id, _ in hits:
+            msg = self.history.messages[doc_id]
+            if msg.token_count > budget:
+                continue
+            recalled.append(msg)
+            budget -= msg.token_count
+        return recalled
+
+    def format_conversation(self, pending: Optional[Message] = None) -> List[Dict]:
+        # Formats the conversation history (plus the pending user message) for sending to the inference API
         formatted_messages = []
 
         # Add system message with the chatbot's personality
@@ -91,60 +621,304 @@ class ChatBot:
             "content": [{"type": "text", "text": self.personality}]
         })
 
-        # Add the last 10 messages from the history
-        for msg in self.history.messages[-10:]:
-            # Ensure content is structured as expected
-            if isinstance(msg.content, str):
-                formatted_content = [{"type": "text", "text": msg.content}]
-            else:
-                formatted_content = msg.content
+        # Add the running summary of earlier messages, if there is one
+        if self.history.summary:
+            formatted_messages.append({
+                "role": "system",
+                "content": [{"type": "text", "text": f"Summary of the earlier conversation:\n{self.history.summary}"}]
+            })
+
+        # Add as many recent messages as fit in the token budget
+        context = self.select_context(pending)
 
+        # Add older messages that are relevant to what the user just said
+        recalled = self.recall_messages(context, pending)
+        if recalled:
+            lines = [f"[{msg.timestamp}] {msg.role}: {msg.text}" for msg in recalled]
             formatted_messages.append({
-                "role": msg.role,
-                "content": formatted_content
+                "role": "system",
+                "content": [{"type": "text", "text": "Relevant earlier messages:\n" + "\n".join(lines)}]
             })
 
+        # Recent messages, as API-ready dicts cached on each message
+        formatted_messages.extend(self.api_messages(context))
+
         return formatted_messages
 
-    def get_response(self, user_input: str) -> str:
-        # Gets a response from the chatbot model based on user input
-        user_content = [{"type": "text", "text": user_input}]  # Format user input
+    def api_messages(self, context: List[Message]) -> List[Dict]:
+        # API-ready context; every image of the newest message is sent, and of the earlier ones only
+        # the most recent `max_prompt_images`, so prompt size stays bounded
+        formatted = [msg.api_message() for msg in context]  # Cached, images described in words
+        remaining = self.max_prompt_images
+
+        def image_url(key: str) -> Optional[str]:
+            nonlocal remaining
+            if remaining <= 0:
+                return None
+            remaining -= 1
+            return self.images.data_url(key)  # Encoded once, reused on later turns
 
-        # Add user input to the conversation history
-        self.history.add_message("user", user_content)
+        for i in range(len(context) - 1, -1, -1):
+            msg = context[i]
+            if msg.parts and any(part.get("type") == "image" for part in msg.parts):
+                if i == len(context) - 1:  # What the user just attached is always sent
+                    formatted[i] = {"role": msg.role, "content": api_content(msg.parts, self.images.data_url)}
+                elif remaining > 0:
+                    formatted[i] = {"role": msg.role, "content": api_content(msg.parts, image_url)}
+        return formatted
 
+    def attach_images(self, images: Sequence[bytes]) -> List[Dict]:
+        # Stores attached images (decoded and downscaled once) and returns their content parts
+        return [self.images.add(data) for data in images]
+
+    def pending_message(self, user_input: str, emotion: Optional[Dict] = None,
+                        images: Sequence[Dict] = ()) -> Message:
+        # The user's new message; it only enters the history once the model has answered
+        return Message(role="user", content=user_message_content(user_input, emotion, images))
+
+    def commit_turn(self, user_message: Message, response: str):
+        # Stores a completed turn; failed turns are never written, so they can't poison later prompts
+        with self.history.lock:
+            self.history.add_message("user", user_message.content)
+            self.history.add_message("assistant", response)
+        self.compact_memory()  # Summarize messages that left the window, in the background
+
+    def get_response(self, user_input: str, emotion: Optional[Dict] = None, images: Sequence[bytes] = ()) -> str:
+        # Gets a response from the chatbot model based on user input and any attached images
         try:
+            user_message = self.pending_message(user_input, emotion, self.attach_images(images))  # Format user input
+
             # Prepare the conversation context
-            messages = self.format_conversation()
+            with span("format_conversation"):
+                messages = self.format_conversation(user_message)
 
-            # Request a response from the model
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=500  # Limit the response length
-            )
+            # Request a response, retrying and falling back to other models if needed
+            with span("inference"):
+                completion = self.requester.call(self.scheduled(lambda model: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=500  # Limit the response length
+                )), admit=self.admit, try_admit=self.try_admit)
 
             # Extract the model's response
             model_response = completion.choices[0].message.content
 
-            # Add model response to the history
-            self.history.add_message("assistant", model_response)
+            # Add the user input and the model response to the history
+            self.commit_turn(user_message, model_response)
 
             return model_response  # Return the response
 
         except Exception as e:
-            # Handle errors and return error message
+            # Handle errors and return error message (the failed turn is not stored)
             error_msg = f"Error: {str(e)}"
             print(f"Debug info - Error occurred: {error_msg}")  # Log error details
             return error_msg
 
-# Entry point for the chatbot application
-async def main(user_input):
+    def stream_response(self, user_input: str, emotion: Optional[Dict] = None,
+                        images: Sequence[bytes] = ()) -> Iterator[str]:
+        # Streams the model's response token by token as it is generated
+        chunks = []  # Pieces of the response received so far
+        failed = False  # Set when the model call fails, so the turn is not stored
+        try:
+            user_message = self.pending_message(user_input, emotion, self.attach_images(images))  # Format user input
+
+            # Prepare the conversation context
+            with span("format_conversation"):
+                messages = self.format_conversation(user_message)
+
+            # Request a streamed response; retries and fallback apply until the stream is open
+            requested = time.perf_counter()
+            stream = self.requester.call(self.scheduled(lambda model: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=500,  # Limit the response length
+                stream=True  # Receive the response incrementally
+            )), hedge=False, admit=self.admit)
+
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content  # Newly generated text, may be empty
+                if token:
+                    if not chunks:
+                        observe("inference_first_token", time.perf_counter() - requested)
+                    chunks.append(token)
+                    yield token
+            observe("inference", time.perf_counter() - requested)
+
+        except Exception as e:
+            # Handle errors and yield the error message
+            failed = True
+            error_msg = f"Error: {str(e)}"
+            print(f"Debug info - Error occurred: {error_msg}")  # Log error details
+            yield error_msg
+
+        finally:
+            # Store the turn once the stream ends (or is closed early by the reader), unless it failed
+            if chunks and not failed:
+                self.commit_turn(user_message, "".join(chunks))
+
+# Asynchronous chatbot sharing one pooled inference client across all sessions
+class AsyncChatBot(ChatBot):
+    """
+    Same conversation handling as ChatBot, but model calls are awaited on the event loop
+    so a slow completion no longer blocks other conversations in the same process.
+    All instances share one AsyncInferenceClient per API key and event loop (keeping its HTTP
+    connections alive between calls), and a semaphore per event loop bounds how many requests
+    are in flight.
+    """
+
+    max_connections = 32  # Upper bound on concurrent requests across all sessions
+    # Bound on in-flight requests, per event loop (a semaphore can't be shared between loops)
+    _connection_slots: Dict[int, Tuple["weakref.ref", asyncio.Semaphore]] = {}  # id(loop) -> (loop, semaphore)
+
+    def __init__(self, *args, **kwargs):
+        # Takes the same options as ChatBot
+        super().__init__(*args, **kwargs)
+        self.turn_lock = asyncio.Lock()  # Keeps turns of the same conversation in order
+
+    def create_client(self):
+        # Reuses the shared async client so connections stay pooled and kept alive
+        return inference_client(self.token, asynchronous=True, base_url=self.base_url,
+                                timeout=self.retry_policy.request_timeout)
+
+    async def aadmit(self):
+        # Async counterpart of admit(): waits for the scheduler on the event loop
+        await self.scheduler.aacquire(self.user, self.priority)
+
+    def ascheduled(self, create: Callable[[str], Awaitable[T]], keep_slot: bool = False) -> Callable[[str], Awaitable[T]]:
+        # Async counterpart of scheduled(); each attempt also takes a connection slot, only once it
+        # was admitted, so queued turns don't starve admitted ones. With keep_slot=True (streams)
+        # the slot stays taken after a successful call until the caller releases connection_slots()
+        async def request(model: str) -> T:
+            slots = self.connection_slots()
+            await slots.acquire()
+            try:
+                result = await create(model)
+            except BaseException as e:
+                slots.release()
+                if isinstance(e, Exception) and status_code(e) == 429:
+                    self.scheduler.throttle(retry_after(e))
+                raise
+            if not keep_slot:
+                slots.release()
+            return result
+        return request
+
+    async def aattach_images(self, images: Sequence[bytes]) -> List[Dict]:
+        # Decodes and downscales attached images on a worker thread, off the event loop
+        if not images:
+            return []
+        return await asyncio.get_running_loop().run_in_executor(None, self.attach_images, images)
+
+    @classmethod
+    def connection_slots(cls) -> asyncio.Semaphore:
+        # Returns the running loop's semaphore bounding concurrent requests, creating it on first use
+        return loop_local(cls._connection_slots, lambda: asyncio.Semaphore(cls.max_connections))
+
+    async def aget_response(self, user_input: str, emotion: Optional[Dict] = None, images: Sequence[bytes] = ()) -> str:
+        # Gets a response from the chatbot model without blocking the event loop
+        async with self.turn_lock:
+            try:
+                user_message = self.pending_message(user_input, emotion, await self.aattach_images(images))
+
+                # Prepare the conversation context
+                with span("format_conversation"):
+                    messages = self.format_conversation(user_message)
+
+                # Request a response from the model, waiting for the scheduler, then a free connection slot
+                with span("inference"):
+                    completion = await self.requester.acall(self.ascheduled(lambda model: self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=500  # Limit the response length
+                    )), admit=self.aadmit, try_admit=self.try_admit)
+
+                # Extract the model's response
+                model_response = completion.choices[0].message.content
+
+                # Add the user input and the model response to the history
+                self.commit_turn(user_message, model_response)
+
+                return model_response  # Return the response
+
+            except Exception as e:
+                # Handle errors and return error message (the failed turn is not stored)
+                error_msg = f"Error: {str(e)}"
+                print(f"Debug info - Error occurred: {error_msg}")  # Log error details
+                return error_msg
+
+    async def astream_response(self, user_input: str, emotion: Optional[Dict] = None,
+                               images: Sequence[bytes] = ()) -> AsyncIterator[str]:
+        # Streams the model's response token by token without blocking the event loop
+        async with self.turn_lock:
+            chunks = []  # Pieces of the response received so far
+            failed = False  # Set when the model call fails, so the turn is not stored
+            try:
+                user_message = self.pending_message(user_input, emotion, await self.aattach_images(images))
+
+                # Prepare the conversation context
+                with span("format_conversation"):
+                    messages = self.format_conversation(user_message)
+
+                # Request a streamed response from the model, holding a connection slot until it finishes
+                requested = time.perf_counter()
+                stream = await self.requester.acall(self.ascheduled(lambda model: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=500,  # Limit the response length
+                    stream=True  # Receive the response incrementally
+                ), keep_slot=True), hedge=False, admit=self.aadmit)
+                try:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        token = chunk.choices[0].delta.content  # Newly generated text, may be empty
+                        if token:
+                            if not chunks:
+                                observe("inference_first_token", time.perf_counter() - requested)
+                            chunks.append(token)
+                            yield token
+                    observe("inference", time.perf_counter() - requested)
+                finally:
+                    self.connection_slots().release()  # Taken when the stream was opened
+
+            except Exception as e:
+                # Handle errors and yield the error message
+                failed = True
+                error_msg = f"Error: {str(e)}"
+                print(f"Debug info - Error occurred: {error_msg}")  # Log error details
+                yield error_msg
+
+            finally:
+                # Store the turn once the stream ends (or is closed early by the reader), unless it failed
+                if chunks and not failed:
+                    self.commit_turn(user_message, "".join(chunks))
+
+    @staticmethod
+    async def agather(requests: Iterable[Tuple["AsyncChatBot", str]]) -> List[str]:
+        # Runs (chatbot, user_input) pairs from many sessions concurrently, results in input order
+        return await asyncio.gather(*(bot.aget_response(text) for bot, text in requests))
+
+# Parses the command-line arguments once per process
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Terminal Chat Application")  # Command-line argument parser
     parser.add_argument("--model", default="meta-llama/Llama-3.2-11B-Vision-Instruct", help="Model name to use")
-    args = parser.parse_args()  # Parse command-line arguments
+    parser.add_argument("--text", action="store_true", help="Type messages instead of speaking them")
+    parser.add_argument("--audio-file", help="Transcribe a WAV recording and use each speech segment as a message")
+    parser.add_argument("--history-backend", choices=["jsonl", "sqlite"], default="jsonl",
+                        help="Where the history is stored: a JSONL journal or a multi-user SQLite database")
+    parser.add_argument("--history-path", help="Journal or database file (defaults to conversation_history.jsonl/.db)")
+    parser.add_argument("--user", default="default", help="Whose history to use with the SQLite backend")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint to use instead of Hugging Face")
+    parser.add_argument("--fsync", choices=["always", "interval", "shutdown"], default="interval",
+                        help="When history writes are forced to disk (they always happen in the background)")
+    return parser.parse_args(argv)  # Parse command-line arguments
 
-    chatbot = ChatBot(model_name=args.model)  # Initialize the chatbot with the specified model
+# Handles a single utterance with an already initialized chatbot
+async def main(user_input, chatbot: Optional[ChatBot] = None):
+    if chatbot is None:  # Standalone call: build a chatbot for this one utterance
+        chatbot = ChatBot(model_name=parse_args().model)  # Initialize the chatbot with the specified model
 
     try:
         if user_input.lower() == 'exit.':  # Exit command
@@ -164,9 +938,61 @@ async def main(user_input):
         # Handle errors and log the details
         print(f"\nAn error occurred: {str(e)}")
 
+# Persistent conversation loop: one chatbot, one event loop, many turns
+async def conversation_loop(args: argparse.Namespace):
+    started = time.perf_counter()
+    if args.history_backend == "sqlite":  # The single-user journal becomes the default user's history
+        legacy_file = "conversation_history.jsonl" if args.user == "default" else None
+    else:
+        legacy_file = "conversation_history.json"
+    storage = open_storage(args.history_backend, args.history_path, user=args.user, legacy_file=legacy_file)
+    chatbot = ChatBot(model_name=args.model, history=ConversationHistory(storage=storage, fsync=args.fsync),
+                      base_url=args.base_url, user=args.user)  # Built once and kept warm across turns
+    print(f"[timing] startup {1000 * (time.perf_counter() - started):.1f} ms")
+
+    # Voice and terminal modules are only imported for the input mode actually used
+    if args.audio_file:
+        from Speech_to_text import transcribe_file  # Pulls in the Whisper backend
+        segments = transcribe_file(args.audio_file)  # Lazy, segment by segment
+    else:
+        segments = None
+        if args.text:
+            import readline  # Improves terminal input handling by enabling line editing and history
+        else:
+            from Speech_to_text import main_stt  # Pulls in RealtimeSTT and PyTorch
+
+    turn_times = []  # Per-turn processing time, excluding the time spent listening
+    while True:
+        listen_started = time.perf_counter()
+        if segments is not None:
+            segment = await asyncio.to_thread(next, segments, None)  # Transcribe the next speech segment
+            if segment is None:  # End of the recording
+                break
+            user_input = segment.text
+        elif args.text:
+            user_input = input("You: ").strip()  # Read a typed message
+        else:
+            user_input = await main_stt()  # Record and transcribe one utterance
+        if not user_input.strip():
+            continue
+        turn_started = time.perf_counter()
+
+        response = await main(user_input, chatbot)
+        if response is False:  # Exit command
+            break
+        print(response)
+
+        turn_ms = 1000 * (time.perf_counter() - turn_started)
+        turn_times.append(turn_ms)
+        print(f"[timing] listen {1000 * (turn_started - listen_started):.1f} ms, turn {turn_ms:.1f} ms")
+
+    if turn_times:
+        print(f"[timing] {len(turn_times)} turns, average {sum(turn_times) / len(turn_times):.1f} ms, "
+              f"max {max(turn_times):.1f} ms")
+
 def start():
-    userinput= asyncio.run(main_stt())
-    print(asyncio.run(main(userinput)) )
+    configure_from_env()  # Optional latency metrics (METRICS_PORT / METRICS_JSON)
+    asyncio.run(conversation_loop(parse_args()))  # Single event loop for the whole session
 
 if __name__ == "__main__":
-    start()# Run the main function as an asynchronous coroutine
+    start()# Run the conversation loop until the user says "exit."
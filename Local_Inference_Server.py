@@ -0,0 +1,204 @@
+# Local stand-in for the inference API, for offline benchmarks and regression tests
+# Usage: python Local_Inference_Server.py --port 8089 --latency-ms 300 --tokens-per-second 40 --error-rate 0.02
+# Then point the chatbot at it:  INFERENCE_BASE_URL=http://127.0.0.1:8089  (or --base-url)
+#
+# Speaks the OpenAI chat-completions protocol (POST /v1/chat/completions, with "stream": true as
+# server-sent events), which is what the chatbot's InferenceClient uses with a base URL. Replies are
+# generated text of a chosen length; timing and failures are controlled by the options below.
+import json  # Request and response bodies
+import time  # Simulated latency and token pacing
+import random  # Latency jitter, error injection and reply text
+import argparse  # To parse command-line arguments
+import threading  # Serves in the background when embedded in a benchmark
+import uuid  # Completion ids
+from dataclasses import dataclass  # Server behaviour settings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Standard library HTTP server
+from typing import Dict, List, Optional  # For type hinting
+
+WORDS = ("I hear you and that sounds really hard . It makes sense to feel this way after everything "
+         "you described , and it may help to take one small step today . What would feel manageable "
+         "right now ? You are not alone in this , and talking about it is a good start .").split()
+
+# How the stand-in behaves
+@dataclass
+class ServerSettings:
+    latency_ms: float = 200.0  # Time before the first token (or the whole reply when not streaming)
+    jitter_ms: float = 50.0  # Random extra latency, uniformly 0..jitter_ms
+    tokens_per_second: float = 50.0  # Generation speed after the first token (0 = instant)
+    reply_tokens: int = 60  # Reply length, capped by the request's max_tokens
+    error_rate: float = 0.0  # Share of requests that fail
+    error_status: int = 503  # HTTP status of injected failures (e.g. 429, 500, 503)
+    rate_limit: float = 0.0  # Requests per second accepted before answering 429, like a provider quota (0 = off)
+
+def reply_tokens(count: int, seed: int) -> List[str]:
+    # Deterministic pseudo-reply of `count` tokens (a word followed by a space)
+    rng = random.Random(seed)
+    start = rng.randrange(len(WORDS))
+    return [WORDS[(start + i) % len(WORDS)] + " " for i in range(count)]
+
+def prompt_tokens(messages: List[Dict]) -> int:
+    # Rough prompt size for the usage block
+    words = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        words += len(str(content).split())
+    return int(words * 1.3)
+
+def make_handler(settings: ServerSettings, stats: Dict[str, int]):
+    quota = {"tokens": max(1.0, settings.rate_limit), "updated": time.monotonic()}  # Provider-side token bucket
+    quota_lock = threading.Lock()
+
+    def over_quota() -> bool:
+        # Whether this request exceeds the simulated provider rate limit
+        if settings.rate_limit <= 0:
+            return False
+        with quota_lock:
+            now = time.monotonic()
+            quota["tokens"] = min(max(1.0, settings.rate_limit),
+                                  quota["tokens"] + (now - quota["updated"]) * settings.rate_limit)
+            quota["updated"] = now
+            if quota["tokens"] < 1:
+                return True
+            quota["tokens"] -= 1
+            return False
+
+    class ChatCompletionsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real endpoint
+
+        def log_message(self, *args):
+            pass  # Keep the console quiet under load
+
+        def _send_json(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/health", "/v1/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "local-stand-in", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "invalid JSON"}})
+                return
+            stats["requests"] += 1
+            if over_quota():
+                stats["rate_limited"] += 1
+                self._send_json(429, {"error": {"message": "rate limit exceeded", "code": 429}},
+                                headers={"Retry-After": "1"})
+                return
+
+            time.sleep((settings.latency_ms + random.uniform(0, settings.jitter_ms)) / 1000)
+            if random.random() < settings.error_rate:
+                stats["errors"] += 1
+                self._send_json(settings.error_status, {"error": {"message": "injected failure",
+                                                                  "code": settings.error_status}})
+                return
+
+            model = request.get("model") or "local-stand-in"
+            count = min(settings.reply_tokens, int(request.get("max_tokens") or settings.reply_tokens))
+            tokens = reply_tokens(count, seed=stats["requests"])
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+            created = int(time.time())
+            usage = {"prompt_tokens": prompt_tokens(request.get("messages", [])),
+                     "completion_tokens": count}
+            usage["total_tokens"] = usage["prompt_tokens"] + count
+            delay = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+
+            if not request.get("stream"):
+                time.sleep(delay * max(0, count - 1))
+                self._send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "system_fingerprint": "local",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                                 "finish_reason": "stop", "logprobs": None}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")  # The stream ends with the connection
+            self.end_headers()
+            try:
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(delay)
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "system_fingerprint": "local",
+                        "choices": [{"index": 0, "delta": {"role": "assistant", "content": token},
+                                     "finish_reason": "stop" if i == len(tokens) - 1 else None, "logprobs": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client stopped reading (e.g. the user cancelled)
+            self.close_connection = True
+
+    return ChatCompletionsHandler
+
+# Runs the stand-in on a background thread, e.g. inside a benchmark
+class LocalInferenceServer:
+    def __init__(self, settings: Optional[ServerSettings] = None, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings or ServerSettings()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}  # Requests, injected failures and 429s
+        self.server = ThreadingHTTPServer((host, port), make_handler(self.settings, self.stats))
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalInferenceServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="local-inference", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for the inference API")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8089, help="Port to listen on")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Time to the first token")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Random extra latency")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Tokens per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second before 429 (0 = off)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    settings = ServerSettings(args.latency_ms, args.jitter_ms, args.tokens_per_second, args.reply_tokens,
+                              args.error_rate, args.error_status, args.rate_limit)
+    server = LocalInferenceServer(settings, args.host, args.port)
+    print(f"Serving chat completions at {server.base_url}/v1/chat/completions")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
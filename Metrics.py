@@ -0,0 +1,203 @@
+# Importing required libraries and modules
+import os  # Reads the metrics settings from the environment
+import json  # For the periodic JSON dump
+import time  # Clock used for span durations
+import bisect  # Finds the histogram bucket of a sample
+import threading  # Locks, the HTTP server thread and the dump thread
+from collections import deque  # Recent samples used for percentiles
+from typing import Dict, Optional  # For type hinting
+
+# Bucket upper bounds in seconds, from 1 ms to 2 minutes
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+enabled = False  # Spans are no-ops until tracing is enabled
+_histograms: Dict[str, "Histogram"] = {}  # Stage name -> latency histogram
+_registry_lock = threading.Lock()  # Guards creation of new histograms
+_gauges: Dict[str, float] = {}  # Gauge name -> current value (e.g. queue depths)
+
+# Latency distribution of one pipeline stage
+class Histogram:
+    def __init__(self, name: str, window: int = 4096):
+        self.name = name  # Stage name, e.g. "inference"
+        self.counts = [0] * (len(BUCKETS) + 1)  # Samples per bucket, the last one is +Inf
+        self.total = 0.0  # Sum of all samples in seconds
+        self.count = 0  # Number of samples
+        self.recent = deque(maxlen=window)  # Latest samples, for p50/p95/p99
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.total += seconds
+            self.count += 1
+            self.recent.append(seconds)
+
+    def percentiles(self) -> Dict[str, float]:
+        # p50/p95/p99 in milliseconds over the recent samples
+        with self.lock:
+            ordered = sorted(self.recent)
+        if not ordered:
+            return {}
+        pick = lambda q: round(1000 * ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+        return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+# Context manager that times one stage when tracing is enabled
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.started)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NOOP_SPAN = _NoopSpan()  # Shared instance, so a disabled span allocates nothing
+
+def span(name: str):
+    """
+    Times the enclosed block as stage `name`:  with span("inference"): ...
+    Costs one function call and no allocation while tracing is disabled.
+    """
+    if not enabled:
+        return _NOOP_SPAN
+    return _Span(name)
+
+def observe(name: str, seconds: float):
+    """
+    Records one duration for stage `name` (for timings that don't fit a with-block).
+    """
+    if not enabled:
+        return
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(name, Histogram(name))
+    histogram.observe(seconds)
+
+def gauge(name: str, value: float):
+    """
+    Sets the current value of gauge `name` (e.g. a queue depth); free while tracing is disabled.
+    """
+    if enabled:
+        _gauges[name] = value
+
+def gauges() -> Dict[str, float]:
+    """
+    Returns the current value of every gauge.
+    """
+    return dict(sorted(_gauges.items()))
+
+def snapshot() -> Dict[str, Dict]:
+    """
+    Returns count, mean and p50/p95/p99 for every stage seen so far.
+    """
+    result = {}
+    for name, histogram in sorted(_histograms.items()):
+        stats = {"count": histogram.count, "mean_ms": round(1000 * histogram.total / histogram.count, 3) if histogram.count else 0.0}
+        stats.update(histogram.percentiles())
+        result[name] = stats
+    return result
+
+def render_prometheus() -> str:
+    """
+    Renders all histograms in the Prometheus text exposition format.
+    """
+    lines = ["# HELP stage_latency_seconds Latency of each chatbot pipeline stage.",
+             "# TYPE stage_latency_seconds histogram"]
+    for name, histogram in sorted(_histograms.items()):
+        with histogram.lock:
+            counts, total, count = list(histogram.counts), histogram.total, histogram.count
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS + (float("inf"),), counts):
+            cumulative += bucket_count
+            label = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'stage_latency_seconds_bucket{{stage="{name}",le="{label}"}} {cumulative}')
+        lines.append(f'stage_latency_seconds_sum{{stage="{name}"}} {total}')
+        lines.append(f'stage_latency_seconds_count{{stage="{name}"}} {count}')
+    lines.append("# TYPE stage_latency_quantile_ms gauge")
+    for name, stats in snapshot().items():
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if key in stats:
+                lines.append(f'stage_latency_quantile_ms{{stage="{name}",quantile="{key[1:3]}"}} {stats[key]}')
+    lines.append("# TYPE gauge_value gauge")
+    for name, value in gauges().items():
+        lines.append(f'gauge_value{{name="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+_server = None  # Metrics endpoint (ThreadingHTTPServer), if started
+_dump_thread: Optional[threading.Thread] = None  # Periodic JSON writer, if started
+
+def start_http_server(port: int, host: str = "127.0.0.1"):
+    """
+    Enables tracing and serves the histograms at http://host:port/metrics.
+    """
+    global _server, enabled
+    enabled = True
+    if _server is None:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Only needed when serving
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                found = self.path.startswith("/metrics")
+                body = render_prometheus().encode() if found else b"see /metrics\n"
+                self.send_response(200 if found else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Keep scrapes out of the console
+
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics available at http://{host}:{port}/metrics")
+
+def start_json_dump(file_path: str, interval: float = 30.0):
+    """
+    Enables tracing and writes snapshot() to `file_path` every `interval` seconds.
+    """
+    global _dump_thread, enabled
+    enabled = True
+    if _dump_thread is not None:
+        return
+
+    def dump_forever():
+        while True:
+            time.sleep(interval)
+            tmp_file = file_path + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump({"time": time.time(), "stages": snapshot(), "gauges": gauges()}, f, indent=2)
+            os.replace(tmp_file, file_path)
+
+    _dump_thread = threading.Thread(target=dump_forever, name="metrics-dump", daemon=True)
+    _dump_thread.start()
+
+def configure_from_env():
+    """
+    Turns tracing on from the environment: METRICS_PORT starts the /metrics endpoint,
+    METRICS_JSON (with optional METRICS_INTERVAL seconds) starts the JSON dump,
+    METRICS=1 only records (useful with snapshot()). Without them tracing stays off.
+    """
+    global enabled
+    if os.getenv("METRICS", "").lower() in ("1", "true", "on"):
+        enabled = True
+    if os.getenv("METRICS_PORT"):
+        start_http_server(int(os.environ["METRICS_PORT"]))
+    if os.getenv("METRICS_JSON"):
+        start_json_dump(os.environ["METRICS_JSON"], float(os.getenv("METRICS_INTERVAL", "30")))
@@ -0,0 +1,305 @@
+# Retries, hedged requests and model fallback around inference calls
+import time  # Deadlines, backoff and latency measurement
+import random  # Backoff jitter
+import asyncio  # Async variant used by AsyncChatBot
+import threading  # Breakers and latency trackers are shared between sessions
+from collections import deque  # Recent latencies for the hedge delay
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait  # Sync hedging
+from dataclasses import dataclass  # Retry settings
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar  # For type hinting
+from Resources import shared  # Breakers, trackers and the hedge pool are process-wide
+from Metrics import observe  # Per-model latency and hedge counts
+
+T = TypeVar("T")
+
+# Errors that retrying or another model will not fix (bad request, bad key, forbidden)
+NON_RETRYABLE_STATUS = {400, 401, 403, 422}
+
+def status_code(error: BaseException) -> Optional[int]:
+    # HTTP status of a failed inference call, if the exception carries one
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(response, "status", None)
+
+def first_line(error: BaseException) -> str:
+    # Short description of an error for log lines
+    text = str(error).strip()
+    return text.splitlines()[0] if text else type(error).__name__
+
+def retry_after(error: BaseException, default: float = 1.0) -> float:
+    # Seconds the provider asked us to wait (Retry-After header of a 429), or `default`
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("Retry-After", default)))
+    except (TypeError, ValueError):
+        return default  # An HTTP date rather than seconds
+
+def is_retryable(error: BaseException) -> bool:
+    # Errors may opt out with a `retryable = False` attribute (e.g. a shed request)
+    return getattr(error, "retryable", True) and status_code(error) not in NON_RETRYABLE_STATUS
+
+def is_model_failure(error: BaseException) -> bool:
+    # Whether an error counts against the model's breaker; a 429 is our rate limit, not an outage
+    return is_retryable(error) and status_code(error) != 429
+
+# Retry, hedging and timeout settings of a ResilientRequester
+@dataclass
+class RetryPolicy:
+    attempts: int = 3  # Calls per turn at most, across all models
+    base_delay: float = 0.25  # First backoff in seconds, doubled after each failure
+    max_delay: float = 4.0  # Longest single backoff
+    deadline: float = 90.0  # Seconds after which a turn stops retrying
+    request_timeout: float = 60.0  # Timeout of a single HTTP request
+    hedge: bool = False  # Send a second request when the first is slower than usual
+    hedge_min_delay: float = 1.0  # Never hedge earlier than this, in seconds
+    hedge_budget: float = 0.1  # At most this share of calls may be hedged (bounds the extra spend)
+
+    def backoff(self, failures: int) -> float:
+        # "Full jitter" exponential backoff: a random delay up to the capped exponential
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (failures - 1)))
+
+# Stops sending traffic to a model that keeps failing, and probes it again after a cool-down
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold  # Consecutive failures that open the circuit
+        self.reset_timeout = reset_timeout  # Seconds the circuit stays open before a trial call
+        self.failures = 0  # Consecutive failures so far
+        self.opened_at: Optional[float] = None  # When the circuit opened, None while closed
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        # Whether a call may go to this model now (always while closed, one trial when half-open)
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()  # Let one trial through, keep the rest waiting
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+# Recent successful call latencies of one model
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        # None until there are enough samples for the percentile to mean something
+        with self.lock:
+            if len(self.samples) < 20:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+def breaker(model: str) -> CircuitBreaker:
+    return shared(f"circuit_breaker:{model}", CircuitBreaker)
+
+def latency_tracker(model: str) -> LatencyTracker:
+    return shared(f"latency_tracker:{model}", LatencyTracker)
+
+# Makes one logical inference call with retries, optional hedging and model fallback
+class ResilientRequester:
+    """
+    call(request) runs request(model) for the first model whose circuit breaker allows it,
+    starting with the primary. A failed call counts against that model's breaker and the
+    next attempt goes to the next model in the list after a jittered exponential backoff,
+    until `attempts` calls were made or the deadline passed. Errors no retry can fix
+    (e.g. 401) are raised at once; a 429 is retried but doesn't count against the breaker.
+
+    With hedging enabled, a call that is still running after the model's recent p95 latency
+    (of calls that may be hedged, so stream opens don't count; at least hedge_min_delay) gets a second identical request to the next available model;
+    the first successful answer wins. Hedges are limited to `hedge_budget` of all calls, so
+    they cut the slow tail without doubling the number of requests.
+
+    admit(), if given, is called before every attempt and may block (e.g. waiting for the
+    request scheduler); the latency of a call is measured only from when it was admitted, and
+    the hedge delay starts then too. A hedge is sent only if try_admit() gets a slot at once.
+    """
+
+    hedge_lock = threading.Lock()
+    calls = 0  # Process-wide count of calls, for the hedge budget
+    hedges = 0  # Process-wide count of hedged calls
+
+    def __init__(self, models: Sequence[str], policy: Optional[RetryPolicy] = None):
+        self.models: List[str] = list(dict.fromkeys(m for m in models if m))  # Primary first, no duplicates
+        self.policy = policy or RetryPolicy()
+
+    def _order(self, start: int) -> List[str]:
+        # All models, starting at position `start`
+        return self.models[start % len(self.models):] + self.models[:start % len(self.models)]
+
+    @staticmethod
+    def _pick(candidates: Sequence[str]) -> Optional[str]:
+        # The first model whose breaker lets a call through; only asked for the model actually
+        # tried next, so a half-open circuit's single trial is not spent on a model never called
+        for model in candidates:
+            if breaker(model).allow():
+                return model
+        return None
+
+    def _may_hedge(self, try_admit: Optional[Callable[[], bool]]) -> bool:
+        with ResilientRequester.hedge_lock:
+            if ResilientRequester.hedges + 1 > self.policy.hedge_budget * ResilientRequester.calls:
+                return False
+            if try_admit is not None and not try_admit():
+                return False  # No free slot: a hedge would only queue behind other requests
+            ResilientRequester.hedges += 1
+            return True
+
+    def _hedge_delay(self, model: str) -> float:
+        p95 = latency_tracker(model).p95()
+        return max(self.policy.hedge_min_delay, p95 if p95 is not None else 0.0)
+
+    def _timed(self, request: Callable[[str], T], model: str, track: bool = True) -> T:
+        # Runs one request, feeding its outcome into the model's breaker and (if `track`) latency tracker
+        started = time.perf_counter()
+        try:
+            result = request(model)
+        except Exception as e:
+            if is_model_failure(e):
+                breaker(model).record_failure()
+            raise
+        elapsed = time.perf_counter() - started
+        breaker(model).record_success()
+        if track:
+            latency_tracker(model).add(elapsed)
+            observe(f"inference_model:{model}", elapsed)
+        return result
+
+    def call(self, request: Callable[[str], T], hedge: Optional[bool] = None,
+             admit: Optional[Callable[[], None]] = None, try_admit: Optional[Callable[[], bool]] = None) -> T:
+        # Synchronous call; hedge=False disables hedging (e.g. for streams), and such calls don't feed
+        # the latency tracker, since opening a stream takes far less than a whole completion
+        track = hedge is not False
+        hedge = self.policy.hedge if hedge is None else hedge
+        deadline = time.monotonic() + self.policy.deadline
+        with ResilientRequester.hedge_lock:
+            ResilientRequester.calls += 1
+        failures, position = 0, 0
+        while True:
+            order = self._order(position)
+            model = order[0]
+            try:
+                if admit is not None:
+                    admit()  # Queueing time is not the model's latency
+                model = self._pick(order) or order[0]  # Everything is failing: keep probing rather than refusing
+                if hedge:
+                    return self._call_hedged(request, model, order, try_admit)
+                return self._timed(request, model, track)
+            except Exception as e:
+                failures += 1
+                position = self.models.index(model) + 1  # Next attempt starts with the next model
+                delay = self.policy.backoff(failures)
+                if not is_retryable(e) or failures >= self.policy.attempts or time.monotonic() + delay > deadline:
+                    raise
+                print(f"Warning: {model} failed ({first_line(e)}), retrying in {delay:.2f} s")
+                time.sleep(delay)
+
+    def _call_hedged(self, request: Callable[[str], T], model: str, order: List[str],
+                     try_admit: Optional[Callable[[], bool]]) -> T:
+        executor = shared("hedge_executor", lambda: ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge"))
+        primary = executor.submit(self._timed, request, model)
+        done, _ = wait([primary], timeout=self._hedge_delay(model))
+        if done or not self._may_hedge(try_admit):
+            return primary.result()
+        second_model = self._pick([m for m in order if m != model]) or model
+        observe("inference_hedged", 0.0)
+        secondary = executor.submit(self._timed, request, second_model)
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        while pending:  # The first success wins; the slower request finishes in the background
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, request: Callable[[str], Awaitable[T]], hedge: Optional[bool] = None,
+                    admit: Optional[Callable[[], Awaitable[None]]] = None,
+                    try_admit: Optional[Callable[[], bool]] = None) -> T:
+        # Asynchronous call; the losing hedged request is cancelled
+        track = hedge is not False
+        hedge = self.policy.hedge if hedge is None else hedge
+        deadline = time.monotonic() + self.policy.deadline
+        with ResilientRequester.hedge_lock:
+            ResilientRequester.calls += 1
+        failures, position = 0, 0
+        while True:
+            order = self._order(position)
+            model = order[0]
+            try:
+                if admit is not None:
+                    await admit()
+                model = self._pick(order) or order[0]
+                if hedge:
+                    return await self._acall_hedged(request, model, order, try_admit)
+                return await self._atimed(request, model, track)
+            except Exception as e:
+                failures += 1
+                position = self.models.index(model) + 1
+                delay = self.policy.backoff(failures)
+                if not is_retryable(e) or failures >= self.policy.attempts or time.monotonic() + delay > deadline:
+                    raise
+                print(f"Warning: {model} failed ({first_line(e)}), retrying in {delay:.2f} s")
+                await asyncio.sleep(delay)
+
+    async def _atimed(self, request: Callable[[str], Awaitable[T]], model: str, track: bool = True) -> T:
+        started = time.perf_counter()
+        try:
+            result = await request(model)
+        except asyncio.CancelledError:
+            raise  # Lost a hedge race, not the model's fault
+        except Exception as e:
+            if is_model_failure(e):
+                breaker(model).record_failure()
+            raise
+        elapsed = time.perf_counter() - started
+        breaker(model).record_success()
+        if track:
+            latency_tracker(model).add(elapsed)
+            observe(f"inference_model:{model}", elapsed)
+        return result
+
+    async def _acall_hedged(self, request: Callable[[str], Awaitable[T]], model: str, order: List[str],
+                            try_admit: Optional[Callable[[], bool]]) -> T:
+        primary = asyncio.ensure_future(self._atimed(request, model))
+        done, _ = await asyncio.wait([primary], timeout=self._hedge_delay(model))
+        if done or not self._may_hedge(try_admit):
+            return await primary
+        second_model = self._pick([m for m in order if m != model]) or model
+        observe("inference_hedged", 0.0)
+        pending = {primary, asyncio.ensure_future(self._atimed(request, second_model))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()  # The slower request is no longer needed
@@ -0,0 +1,43 @@
+# Process-wide registry of expensive objects: inference clients, speech models, loaded histories
+# Streamlit re-executes web_ui.py on every interaction, but imported modules stay loaded,
+# so whatever is registered here is built once per process and shared by every session.
+import time  # Records how long each resource took to build
+import threading  # Resources are requested from many sessions at once
+from typing import Any, Callable, Dict  # For type hinting
+
+_resources: Dict[str, Any] = {}  # name -> built resource
+_build_locks: Dict[str, threading.Lock] = {}  # name -> lock held while it is built
+_registry_lock = threading.Lock()  # Guards _build_locks
+build_times: Dict[str, float] = {}  # name -> milliseconds spent building it
+
+def shared(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    Returns the resource registered as `name`, calling factory() to build it the first time.
+    Lookups after that are a dictionary read. Concurrent first requests for the same name
+    wait for a single build; different names build in parallel.
+    """
+    try:
+        return _resources[name]
+    except KeyError:
+        pass
+    with _registry_lock:
+        lock = _build_locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _resources:
+            started = time.perf_counter()
+            _resources[name] = factory()
+            build_times[name] = round(1000 * (time.perf_counter() - started), 3)
+    return _resources[name]
+
+def release(name: str) -> Any:
+    """
+    Forgets the resource `name` (it is rebuilt on the next request) and returns it, or None.
+    """
+    build_times.pop(name, None)
+    return _resources.pop(name, None)
+
+def loaded() -> Dict[str, float]:
+    """
+    Returns the names of all built resources with their build time in milliseconds.
+    """
+    return dict(build_times)
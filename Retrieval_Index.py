@@ -0,0 +1,200 @@
+# Importing required libraries and modules
+import os  # Provides functionalities for interacting with the operating system
+import re  # Regular expressions for tokenization
+import json  # For persisting the index
+import math  # Logarithms for BM25's inverse document frequency
+import heapq  # Top-k selection without sorting every candidate
+from array import array  # Compact posting lists
+from typing import List, Dict, Tuple, Optional, Iterable  # For type hinting complex data structures
+
+np = None  # NumPy, loaded on the first search (optional: vectorized scoring of long posting lists)
+use_numpy = True  # Set to False to force the pure Python scorer
+_numpy_checked = False  # Whether importing NumPy has been attempted
+
+def _numpy():
+    # Imports NumPy on first use so loading the chatbot stays fast; None if unavailable or disabled
+    global np, _numpy_checked
+    if use_numpy and not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np if use_numpy else None
+
+WORD_PATTERN = re.compile(r"\w+")  # Terms are runs of letters and digits
+
+# Very common English words carry no retrieval signal and have the longest posting lists
+STOPWORDS = frozenset("""
+a about after again all am an and any are as at be because been before being but by can could did do does
+doing don for from had has have having he her here hers him his how i if in into is it its itself just me
+more most my myself no nor not now of off on once only or other our ours out over own same she should so
+some such than that the their theirs them then there these they this those through to too under until up
+very was we were what when where which while who whom why will with would you your yours yourself
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    # Lowercases the text and splits it into indexable terms
+    return [t for t in WORD_PATTERN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+# Incrementally maintained BM25 inverted index over conversation messages
+class BM25Index:
+    """
+    Every message gets a document id equal to its position in the history, and is added
+    once when it is written. Posting lists are compact arrays; when NumPy is installed,
+    scoring runs vectorized over them so a query stays in the low milliseconds even with
+    100k stored messages.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_df_ratio: float = 0.2):
+        self.k1 = k1  # Term frequency saturation
+        self.b = b  # Document length normalization
+        self.max_df_ratio = max_df_ratio  # Query terms in a larger share of messages are ignored
+        self.postings: Dict[str, Tuple[array, array]] = {}  # term -> (document ids, term frequencies)
+        self.doc_lengths = array('I')  # Number of terms in each document
+        self.total_length = 0  # Sum of doc_lengths, for the average document length
+        self.cursor = 0  # Storage cursor (e.g. journal size) when the index was last in sync with the history
+        self._np_lengths = None  # Cached NumPy copy of doc_lengths, refreshed when documents are added
+
+    @property
+    def count(self) -> int:
+        # Number of documents (messages) indexed so far
+        return len(self.doc_lengths)
+
+    def memory_estimate(self) -> int:
+        # Approximate bytes used by the posting lists and document lengths
+        postings = sum(ids.itemsize * len(ids) + tfs.itemsize * len(tfs) + 120 for ids, tfs in self.postings.values())
+        return postings + self.doc_lengths.itemsize * len(self.doc_lengths)
+
+    def add(self, text: str) -> int:
+        # Indexes the next document and returns its id
+        doc_id = len(self.doc_lengths)
+        terms = tokenize(text)
+        frequencies: Dict[str, int] = {}
+        for term in terms:
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, tf in frequencies.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array('I'), array('H'))
+            posting[0].append(doc_id)
+            posting[1].append(min(tf, 65535))
+        self.doc_lengths.append(len(terms))
+        self.total_length += len(terms)
+        self._np_lengths = None
+        return doc_id
+
+    def search(self, query: str, k: int = 3, exclude_from: Optional[int] = None) -> List[Tuple[int, float]]:
+        # Returns up to k (document id, score) pairs, best first; ids >= exclude_from are skipped
+        n = len(self.doc_lengths)
+        terms = [t for t in set(tokenize(query)) if t in self.postings]
+        if not terms or n == 0:
+            return []
+        # Terms found in most messages barely change the ranking but have the longest posting lists
+        rare = [t for t in terms if len(self.postings[t][0]) <= self.max_df_ratio * n]
+        terms = rare or [min(terms, key=lambda t: len(self.postings[t][0]))]
+        limit = n if exclude_from is None else min(n, exclude_from)
+        avg_length = self.total_length / n or 1.0
+        if _numpy() is not None:
+            return self._search_numpy(terms, k, limit, n, avg_length)
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            for doc_id, tf in zip(ids, tfs):
+                if doc_id >= limit:
+                    break  # Ids are appended in increasing order
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _search_numpy(self, terms, k, limit, n, avg_length) -> List[Tuple[int, float]]:
+        # Vectorized BM25 scoring over the matching posting lists
+        if self._np_lengths is None:
+            self._np_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+        all_ids, all_scores = [], []
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids = np.frombuffer(posting[0], dtype=np.uint32)
+            tfs = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            cut = int(np.searchsorted(ids, limit))  # Ids are sorted, drop excluded ones
+            ids, tfs = ids[:cut], tfs[:cut]
+            idf = math.log(1 + (n - len(posting[0]) + 0.5) / (len(posting[0]) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._np_lengths[ids] / avg_length)
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not all_ids:
+            return []
+        ids = np.concatenate(all_ids)
+        scores = np.concatenate(all_scores)
+        if len(all_ids) > 1:  # Sum the scores of documents matching several terms
+            if len(ids) > limit // 8:  # Long lists: a dense accumulator beats sorting
+                scores = np.bincount(ids, weights=scores, minlength=limit)
+                ids = np.flatnonzero(scores)
+                scores = scores[ids]
+            else:
+                ids, inverse = np.unique(ids, return_inverse=True)
+                scores = np.bincount(inverse, weights=scores)
+        if len(ids) > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def dumps(self) -> str:
+        # Serializes the index as compact JSON
+        data = {
+            "cursor": self.cursor,
+            "total_length": self.total_length,
+            "doc_lengths": self.doc_lengths.tolist(),
+            "postings": {term: [ids.tolist(), tfs.tolist()] for term, (ids, tfs) in self.postings.items()},
+        }
+        return json.dumps(data, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, text: Optional[str]) -> "BM25Index":
+        # Reads a serialized index, or returns an empty one if it is missing or unreadable
+        index = cls()
+        if not text:
+            return index
+        try:
+            data = json.loads(text)
+            index.cursor = data["cursor"]
+            index.total_length = data["total_length"]
+            index.doc_lengths = array('I', data["doc_lengths"])
+            index.postings = {term: (array('I', ids), array('H', tfs)) for term, (ids, tfs) in data["postings"].items()}
+        except (json.JSONDecodeError, KeyError, ValueError, OverflowError):
+            print("Warning: Could not load search index. Rebuilding it.")
+            return cls()
+        return index
+
+    def save(self, file_path: str):
+        # Writes the index atomically to a file
+        tmp_file = file_path + ".tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(self.dumps())
+        os.replace(tmp_file, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> "BM25Index":
+        # Reads a saved index file, or returns an empty index if it is missing
+        if not os.path.exists(file_path):
+            return cls()
+        with open(file_path, 'r') as f:
+            return cls.loads(f.read())
+
+    def extend(self, texts: Iterable[str]) -> int:
+        # Indexes several documents in order and returns how many were added
+        added = 0
+        for text in texts:
+            self.add(text)
+            added += 1
+        return added
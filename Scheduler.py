@@ -0,0 +1,265 @@
+# Fair admission of inference requests: per-user and global token buckets with priorities
+# Every model call (chat turns, summaries, batch jobs) asks the process-wide scheduler for a
+# slot first, so the requests of all sessions share the provider's rate limit fairly instead
+# of racing each other into 429 responses.
+import os  # Reads the limits from the environment
+import time  # Token refill and queueing time
+import asyncio  # Async callers wait without blocking the event loop
+import threading  # Callers arrive from many sessions at once
+from collections import OrderedDict, deque  # Round-robin order of users, their waiting requests
+from typing import Deque, Dict, Optional  # For type hinting
+from Resources import shared  # One scheduler per process
+from Metrics import gauge, observe  # Queue depths and waiting times
+
+PRIORITIES = ("interactive", "batch")  # Served in this order
+
+# Raised instead of queueing when the scheduler is saturated (load shedding)
+class SchedulerOverloaded(Exception):
+    retryable = False  # Retrying at once would only add to the queue
+
+# Raised when the caller withdrew a request that was still waiting (e.g. its session closed)
+class RequestCancelled(Exception):
+    retryable = False
+
+# Refills `rate` tokens per second up to `burst`; a rate of 0 means unlimited
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst  # Starts full
+        self.updated = time.monotonic()  # Last refill (in the future while paused)
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def ready(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self.refill(now)
+        return self.tokens >= 1
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def wait_time(self, now: float) -> float:
+        # Seconds until the next token is available
+        if self.ready(now):
+            return 0.0
+        return max(0.0, self.updated - now) + (1 - self.tokens) / self.rate
+
+    def full(self, now: float) -> bool:
+        return self.rate <= 0 or (self.ready(now) and self.tokens >= self.burst)
+
+# A request waiting for admission
+class _Ticket:
+    __slots__ = ("user", "priority", "granted")
+
+    def __init__(self, user: str, priority: str):
+        self.user = user
+        self.priority = priority
+        self.granted = False
+
+# Decides which waiting request may call the model next
+class RequestScheduler:
+    """
+    acquire(user, priority) blocks until the request may be sent. A request needs a token
+    from the global bucket (the provider's limit) and one from the user's own bucket, so a
+    single busy user can't use up the quota of everyone else. Waiting interactive requests
+    are served before batch ones; within a priority, users take turns (round robin) and
+    each user's requests keep their order.
+
+    Queues are bounded: when `max_queue` requests of a priority are already waiting, or a
+    request waited longer than its priority's limit, SchedulerOverloaded is raised so the
+    caller can fail fast instead of piling up. throttle(seconds) pauses all traffic, e.g.
+    after the provider answered 429 with a Retry-After. try_acquire(user, priority) takes a
+    slot only if one is free at once, for optional extra requests such as hedges.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None, user_rate: float = 0.0,
+                 user_burst: Optional[float] = None, max_queue: int = 64, max_wait: float = 30.0,
+                 batch_max_wait: float = 600.0):
+        self.global_bucket = TokenBucket(rate, burst if burst is not None else max(1.0, rate))
+        self.user_rate = user_rate  # Requests per second per user (0 = unlimited)
+        self.user_burst = user_burst if user_burst is not None else max(1.0, 2 * user_rate)
+        self.buckets: Dict[str, TokenBucket] = {}  # user -> their token bucket
+        self.queues: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self.depth = {p: 0 for p in PRIORITIES}  # Waiting requests per priority
+        self.max_queue = max_queue  # Most waiting requests per priority before new ones are shed
+        self.max_wait = {"interactive": max_wait, "batch": batch_max_wait}  # Longest wait per priority
+        self.paused_until = 0.0  # No request is admitted before this time (after a 429)
+        self.admitted = {p: 0 for p in PRIORITIES}  # Counters for monitoring
+        self.shed = {p: 0 for p in PRIORITIES}
+        self.condition = threading.Condition()  # Guards all of the above
+
+    @classmethod
+    def from_env(cls) -> "RequestScheduler":
+        # Limits from the environment; without INFERENCE_RATE_LIMIT only queueing fairness applies
+        burst = os.getenv("INFERENCE_BURST")
+        user_burst = os.getenv("INFERENCE_USER_BURST")
+        return cls(rate=float(os.getenv("INFERENCE_RATE_LIMIT", "0")),
+                   burst=float(burst) if burst else None,
+                   user_rate=float(os.getenv("INFERENCE_USER_RATE_LIMIT", "0")),
+                   user_burst=float(user_burst) if user_burst else None,
+                   max_queue=int(os.getenv("INFERENCE_QUEUE_MAX", "64")),
+                   max_wait=float(os.getenv("INFERENCE_QUEUE_WAIT", "30")),
+                   batch_max_wait=float(os.getenv("INFERENCE_BATCH_QUEUE_WAIT", "600")))
+
+    def _bucket(self, user: str) -> TokenBucket:
+        bucket = self.buckets.get(user)
+        if bucket is None:
+            if len(self.buckets) >= 4096:  # Forget users whose bucket refilled completely
+                now = time.monotonic()
+                for name in [name for name, b in self.buckets.items() if b.full(now)]:
+                    del self.buckets[name]
+            bucket = self.buckets[user] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _publish(self):
+        for priority in PRIORITIES:
+            gauge(f"scheduler_queue_depth:{priority}", self.depth[priority])
+
+    def _dispatch(self, now: float):
+        # Admits as many waiting requests as the buckets allow; called with the condition held
+        granted = False
+        while now >= self.paused_until and self.global_bucket.ready(now):
+            ticket = None
+            for priority in PRIORITIES:
+                queue = self.queues[priority]
+                for user, tickets in queue.items():
+                    if self._bucket(user).ready(now):
+                        ticket = tickets.popleft()
+                        if tickets:
+                            queue.move_to_end(user)  # The next request of this user waits its turn
+                        else:
+                            del queue[user]
+                        break
+                if ticket is not None:
+                    break
+            if ticket is None:
+                break
+            self.global_bucket.take()
+            self._bucket(ticket.user).take()
+            ticket.granted = True
+            self.depth[ticket.priority] -= 1
+            self.admitted[ticket.priority] += 1
+            granted = True
+        if granted:
+            self._publish()
+            self.condition.notify_all()
+
+    def _next_wake(self, now: float) -> float:
+        # Seconds until another request could be admitted
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.global_bucket.ready(now):
+            return self.global_bucket.wait_time(now)
+        waits = [self._bucket(user).wait_time(now) for queue in self.queues.values() for user in queue]
+        return min(waits, default=0.05) or 0.001
+
+    def _enqueue(self, user: str, priority: str) -> _Ticket:
+        if priority not in self.queues:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {PRIORITIES}")
+        if self.depth[priority] >= self.max_queue:
+            self.shed[priority] += 1
+            raise SchedulerOverloaded("The assistant is very busy right now, please try again in a moment")
+        ticket = _Ticket(user, priority)
+        self.queues[priority].setdefault(user, deque()).append(ticket)
+        self.depth[priority] += 1
+        self._publish()
+        self._dispatch(time.monotonic())
+        return ticket
+
+    def _withdraw(self, ticket: _Ticket):
+        # Removes a waiting request from its queue; called with the condition held
+        tickets = self.queues[ticket.priority].get(ticket.user)
+        tickets.remove(ticket)
+        if not tickets:
+            del self.queues[ticket.priority][ticket.user]
+        self.depth[ticket.priority] -= 1
+        self._publish()
+
+    def _give_up(self, ticket: _Ticket, waited: float):
+        # Removes a request that waited too long; called with the condition held
+        self._withdraw(ticket)
+        self.shed[ticket.priority] += 1
+        raise SchedulerOverloaded(f"No inference capacity after waiting {waited:.0f} s, please try again")
+
+    def acquire(self, user: str, priority: str = "interactive", cancel: Optional[threading.Event] = None):
+        # Blocks until `user` may send one request; RequestCancelled once `cancel` is set while waiting
+        started = time.monotonic()
+        deadline = started + self.max_wait.get(priority, 0.0)
+        with self.condition:
+            ticket = self._enqueue(user, priority)
+            while not ticket.granted:
+                now = time.monotonic()
+                if cancel is not None and cancel.is_set():
+                    self._withdraw(ticket)
+                    raise RequestCancelled("The request was withdrawn while waiting for inference capacity")
+                if now >= deadline:
+                    self._give_up(ticket, now - started)
+                timeout = min(self._next_wake(now), deadline - now)
+                self.condition.wait(timeout if cancel is None else min(timeout, 0.1))
+                self._dispatch(time.monotonic())
+        observe(f"scheduler_wait:{priority}", time.monotonic() - started)
+
+    async def aacquire(self, user: str, priority: str = "interactive"):
+        # Same as acquire, but waits on the event loop
+        started = time.monotonic()
+        deadline = started + self.max_wait.get(priority, 0.0)
+        with self.condition:
+            ticket = self._enqueue(user, priority)
+        try:
+            while True:
+                with self.condition:
+                    self._dispatch(time.monotonic())
+                    if ticket.granted:
+                        break
+                    now = time.monotonic()
+                    if now >= deadline:
+                        self._give_up(ticket, now - started)
+                    delay = min(self._next_wake(now), deadline - now, 0.05)
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            with self.condition:  # A cancelled caller must not keep its place in the queue
+                if not ticket.granted:
+                    self._withdraw(ticket)
+            raise
+        observe(f"scheduler_wait:{priority}", time.monotonic() - started)
+
+    def try_acquire(self, user: str, priority: str = "interactive") -> bool:
+        # Takes a slot only if one is free right now and nobody of the same or a higher priority waits
+        if priority not in self.queues:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {PRIORITIES}")
+        with self.condition:
+            now = time.monotonic()
+            ahead = PRIORITIES[:PRIORITIES.index(priority) + 1]
+            if (now < self.paused_until or any(self.depth[p] for p in ahead)
+                    or not self.global_bucket.ready(now) or not self._bucket(user).ready(now)):
+                return False
+            self.global_bucket.take()
+            self._bucket(user).take()
+            self.admitted[priority] += 1
+            return True
+
+    def throttle(self, seconds: float):
+        # Admits nothing for `seconds` (the provider asked us to slow down)
+        with self.condition:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            bucket = self.global_bucket
+            bucket.refill(now)
+            bucket.tokens = min(bucket.tokens, 0.0)  # Restart slowly afterwards
+            bucket.updated = max(bucket.updated, self.paused_until)  # No refill during the pause
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        # Waiting, admitted and shed requests per priority
+        with self.condition:
+            return {p: {"waiting": self.depth[p], "admitted": self.admitted[p], "shed": self.shed[p]}
+                    for p in PRIORITIES}
+
+def request_scheduler() -> RequestScheduler:
+    # The process-wide scheduler, configured from the environment on first use
+    return shared("request_scheduler", RequestScheduler.from_env)
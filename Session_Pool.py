@@ -0,0 +1,204 @@
+# Importing required libraries and modules
+import os  # Reads the pool limits from the environment
+import atexit  # Flushes the sessions when the server stops
+import time  # Idle time of each session
+import threading  # The pool is shared by all Streamlit sessions
+from collections import OrderedDict  # Least recently used order
+from concurrent.futures import ThreadPoolExecutor  # Flushes evicted sessions off the request path
+from contextlib import contextmanager  # Leases as a with block
+from typing import Callable, Dict, Iterator, Set  # For type hinting
+from History_Storage import SQLiteStorage  # Per-user histories in one database
+from Language_Model import ChatBot, ConversationHistory  # What each session holds
+from Resources import shared  # The pool outlives Streamlit reruns
+
+def sqlite_chatbot_factory(db_file: str = "conversation_history.db", **chatbot_options) -> Callable[[str], ChatBot]:
+    """
+    Returns a factory that builds a user's ChatBot over their history in the shared
+    SQLite database, with the personality stored per user as well.
+    """
+    def create(user: str) -> ChatBot:
+        history = ConversationHistory(storage=SQLiteStorage(db_file, user=user))
+        return ChatBot(history=history, personality_file=None, user=user, **chatbot_options)
+    return create
+
+# Hands out one ChatBot per user and keeps only the recently active ones in memory
+class SessionPool:
+    """
+    get(user) returns the user's ChatBot, loading it from storage on first use. Code that
+    keeps using a session across a whole turn (a streamed response, the voice loop) leases
+    it instead, with `with pool.lease(user) as chatbot:` or acquire(user)/release(user);
+    a leased session is never evicted, and releasing it counts as activity.
+
+    Sessions are kept in least recently used order; the oldest unleased ones are evicted
+    when more than `max_sessions` are resident, when their estimated memory exceeds
+    `max_memory_mb`, or when they have been idle for `ttl` seconds. Evicted sessions are
+    flushed (search index saved, pending writes on disk) on a background thread, never on
+    a request, and rebuilt lazily from storage when the user comes back; a user whose old
+    session is still being flushed waits for that to finish, so the new session never
+    reads a stale index.
+    """
+
+    def __init__(self, factory: Callable[[str], ChatBot], max_sessions: int = 64,
+                 ttl: float = 1800.0, max_memory_mb: float = 512.0):
+        self.factory = factory  # Builds a user's ChatBot from storage
+        self.max_sessions = max_sessions  # Most sessions kept in memory
+        self.ttl = ttl  # Seconds of inactivity before a session is evicted (0 disables)
+        self.max_memory = max_memory_mb * 1024 * 1024  # Memory cap over all resident sessions, in bytes
+        self.sessions: "OrderedDict[str, ChatBot]" = OrderedDict()  # user -> ChatBot, least recent first
+        self.last_used: Dict[str, float] = {}  # user -> time of the last get() or release()
+        self.leases: Dict[str, int] = {}  # user -> number of callers currently using the session
+        self.dropped: Set[str] = set()  # Leased sessions to drop once their last lease ends
+        self.lock = threading.Lock()  # Guards sessions, last_used, leases and dropped
+        self.loading: Dict[str, threading.Lock] = {}  # Per-user locks so a history is only loaded once
+        self.closing: Dict[str, threading.Event] = {}  # Users whose evicted session is still being flushed
+        self.flusher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-flush")  # Flushes evicted sessions
+
+    def get(self, user: str) -> ChatBot:
+        # Returns the user's session, marking it as most recently used
+        return self._checkout(user, lease=False)
+
+    def acquire(self, user: str) -> ChatBot:
+        # Returns the user's session and keeps it resident until the matching release(user)
+        return self._checkout(user, lease=True)
+
+    def release(self, user: str):
+        # Ends one lease; the session becomes evictable again once nobody uses it
+        with self.lock:
+            self.leases[user] -= 1
+            if self.leases[user]:
+                return
+            del self.leases[user]
+            self.last_used[user] = time.monotonic()
+            chatbot = None
+            if user in self.dropped:
+                self.dropped.discard(user)
+                chatbot = self._remove(user) if user in self.sessions else None
+        if chatbot is not None:
+            self._flush_later(user, chatbot)
+        self.evict()
+
+    @contextmanager
+    def lease(self, user: str) -> Iterator[ChatBot]:
+        # The user's session, leased for the duration of the with block
+        chatbot = self.acquire(user)
+        try:
+            yield chatbot
+        finally:
+            self.release(user)
+
+    def _checkout(self, user: str, lease: bool) -> ChatBot:
+        with self.lock:
+            chatbot = self.sessions.get(user)
+            if chatbot is not None:
+                self.sessions.move_to_end(user)
+                self.last_used[user] = time.monotonic()
+                if lease:
+                    self.leases[user] = self.leases.get(user, 0) + 1
+            else:
+                user_lock = self.loading.setdefault(user, threading.Lock())
+        if chatbot is not None:
+            self.evict()  # Also expires other users' idle sessions
+            return chatbot
+
+        with user_lock:  # Other users are not blocked while this history loads
+            while True:
+                with self.lock:
+                    chatbot = self.sessions.get(user)
+                    closing = self.closing.get(user)
+                    if chatbot is not None and lease:
+                        self.leases[user] = self.leases.get(user, 0) + 1
+                if chatbot is not None or closing is None:
+                    break
+                closing.wait()  # Rebuild only from what the evicted session has finished writing
+            if chatbot is None:
+                chatbot = self.factory(user)
+                with self.lock:
+                    self.sessions[user] = chatbot
+                    self.last_used[user] = time.monotonic()
+                    self.loading.pop(user, None)
+                    if lease:
+                        self.leases[user] = self.leases.get(user, 0) + 1
+        self.evict()
+        return chatbot
+
+    def evict(self):
+        # Drops idle sessions, then the least recently used ones until the pool fits its limits;
+        # leased sessions stay, and the evicted ones are flushed in the background
+        now = time.monotonic()
+        evicted = []
+        with self.lock:
+            newest = next(reversed(self.sessions), None)  # Always stays, its caller is about to use it
+            idle = [user for user in self.sessions if user not in self.leases and user != newest]  # Least recent first
+            if self.ttl:
+                for user in [u for u in idle if now - self.last_used[u] > self.ttl]:
+                    evicted.append((user, self._remove(user)))
+                    idle.remove(user)
+            while idle and len(self.sessions) > self.max_sessions:
+                user = idle.pop(0)
+                evicted.append((user, self._remove(user)))
+            while idle and self.memory_estimate() > self.max_memory:
+                user = idle.pop(0)
+                evicted.append((user, self._remove(user)))
+        for user, chatbot in evicted:
+            self._flush_later(user, chatbot)
+
+    def _remove(self, user: str) -> ChatBot:
+        # Takes a session out of the pool; get() for this user waits until _flush is done with it
+        self.last_used.pop(user, None)
+        self.closing[user] = threading.Event()
+        return self.sessions.pop(user)
+
+    def _flush_later(self, user: str, chatbot: ChatBot):
+        try:
+            self.flusher.submit(self._flush, user, chatbot)
+        except RuntimeError:  # The pool is shutting down
+            self._flush(user, chatbot)
+
+    def _flush(self, user: str, chatbot: ChatBot):
+        try:
+            chatbot.close()
+        except Exception as e:
+            print(f"Warning: Could not flush the session of {user}: {e}")
+        finally:
+            with self.lock:
+                closing = self.closing.pop(user)
+            closing.set()
+
+    def memory_estimate(self) -> int:
+        # Approximate bytes held by all resident sessions
+        return sum(chatbot.history.memory_estimate() for chatbot in list(self.sessions.values()))
+
+    def drop(self, user: str):
+        # Flushes and forgets one user's session (e.g. on sign out), once nobody is using it
+        with self.lock:
+            if user in self.leases:
+                self.dropped.add(user)
+                return
+            chatbot = self._remove(user) if user in self.sessions else None
+        if chatbot is not None:
+            self._flush_later(user, chatbot)
+
+    def close(self):
+        # Flushes every session, leased or not, e.g. when the server shuts down
+        self.flusher.shutdown(wait=True)  # Evictions already under way finish first
+        with self.lock:
+            evicted = [(user, self._remove(user)) for user in list(self.sessions)]
+        for user, chatbot in evicted:
+            self._flush(user, chatbot)
+
+def _create_session_pool() -> SessionPool:
+    pool = SessionPool(
+        sqlite_chatbot_factory(os.getenv("HISTORY_DB", "conversation_history.db")),
+        max_sessions=int(os.getenv("SESSION_MAX", "64")),
+        ttl=float(os.getenv("SESSION_TTL", "1800")),
+        max_memory_mb=float(os.getenv("SESSION_MEMORY_MB", "512")),
+    )
+    atexit.register(pool.close)
+    return pool
+
+def get_session_pool() -> SessionPool:
+    """
+    Returns the process-wide session pool, creating it on first use. Its limits come from
+    SESSION_MAX (sessions), SESSION_TTL (seconds) and SESSION_MEMORY_MB in the environment.
+    """
+    return shared("session_pool", _create_session_pool)
@@ -1,9 +1,16 @@
 # Importing necessary libraries and modules
-from RealtimeSTT import AudioToTextRecorder  # Custom module for real-time speech-to-text recording
-import speech_recognition as sr  # Speech recognition library for converting audio to text
 import time  # Provides time-related functions
   # Manages bidirectional text rendering (e.g., Arabic)
+import os  # Reads the speech-to-text profile from the environment
 import asyncio  # Supports asynchronous programming
+import atexit  # Shuts the recorder down when the process exits
+import threading  # Serializes access to the shared recorder
+import wave  # Streams WAV files for file transcription
+import numpy as np  # Audio sample processing
+from collections import deque  # Pre-roll buffer for voice activity detection
+from Metrics import span, observe  # Per-stage latency tracing
+from Resources import shared  # The warm recorder survives web UI reruns
+from dataclasses import dataclass, replace  # Immutable speech-to-text profiles
 
 # Comments for installing CUDA, cuDNN, and related PyTorch dependencies for GPU support:
 # Ensure CUDA and cuDNN are installed for GPU acceleration with PyTorch.
@@ -16,7 +23,7 @@ import asyncio  # Supports asynchronous programming
 # pip install torch==2.5.1+cu121 torchaudio==2.5.1 --index-url https://download.pytorch.org/whl/cu121
 
 # Ensure that cuDNN is installed for your version of CUDA.
-# If a powerful CPU is available, line 52 can be modified to switch from GPU (CUDA) to CPU.
+# Without a GPU the "auto" profile switches to CPU with int8 quantization (see STTProfile below).
 
 # Regular expression to match Arabic characters
 
@@ -43,16 +50,291 @@ async def recorder_and_recognizer(log, recorder):
         print(f"Error with AudioToTextRecorder: {e}")  # Handle recording errors gracefully
     return log  # Return the updated log
 
+# Speech-to-text settings for one deployment (model size, device and numeric precision)
+@dataclass(frozen=True)
+class STTProfile:
+    model: str = "tiny"  # Whisper model size (tiny, base, small, medium, large-v3, ...)
+    device: str = "auto"  # "cuda", "cpu" or "auto" to pick whatever is available
+    compute_type: str = "auto"  # float32, float16, int8, int8_float16, ... or "auto"
+
+    def resolve(self):
+        """
+        Returns a copy with "auto" replaced by concrete device and compute type values.
+        GPUs use float16; CPUs use int8, which is several times faster than float32 there.
+        """
+        device = detect_device() if self.device == "auto" else self.device
+        compute_type = self.compute_type
+        if compute_type == "auto":
+            compute_type = "float16" if device == "cuda" else "int8"
+        return replace(self, device=device, compute_type=compute_type)
+
+# Named profiles selectable with the STT_PROFILE environment variable
+STT_PROFILES = {
+    "auto": STTProfile(),
+    "gpu-float32": STTProfile("tiny", "cuda", "float32"),  # Original hard-coded setting
+    "gpu-float16": STTProfile("tiny", "cuda", "float16"),
+    "cpu-float32": STTProfile("tiny", "cpu", "float32"),
+    "cpu-int8": STTProfile("tiny", "cpu", "int8"),
+    "cpu-int8-float16": STTProfile("tiny", "cpu", "int8_float16"),  # CTranslate2 falls back to the closest CPU type
+    "cpu-int8-base": STTProfile("base", "cpu", "int8"),
+    "cpu-int8-small": STTProfile("small", "cpu", "int8"),
+}
+
+def detect_device():
+    """
+    Returns "cuda" when a CUDA device is usable by the Whisper backend, otherwise "cpu".
+    """
+    try:
+        import ctranslate2  # Backend used by faster-whisper, which RealtimeSTT runs on
+        if ctranslate2.get_cuda_device_count() > 0:
+            return "cuda"
+    except Exception:
+        pass
+    return "cpu"
+
+def load_profile(name=None):
+    """
+    Builds the profile for this host from STT_PROFILE, with optional STT_MODEL,
+    STT_DEVICE and STT_COMPUTE_TYPE overrides, and resolves "auto" values.
+    """
+    name = name or os.getenv("STT_PROFILE", "auto")
+    if name not in STT_PROFILES:
+        raise ValueError(f"Unknown STT profile '{name}'. Choose from: {', '.join(STT_PROFILES)}")
+    profile = STT_PROFILES[name]
+    profile = replace(
+        profile,
+        model=os.getenv("STT_MODEL", profile.model),
+        device=os.getenv("STT_DEVICE", profile.device),
+        compute_type=os.getenv("STT_COMPUTE_TYPE", profile.compute_type),
+    )
+    return profile.resolve()
+
+# Long-lived speech-to-text service that keeps the Whisper model and microphone open
+class SpeechToTextService:
+    """
+    Loads the recorder (and its Whisper model) once and reuses it for every utterance,
+    so each call only pays for transcription instead of model load and audio setup.
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile or load_profile()  # Model size, device and precision for this host
+        self.recorder = None  # AudioToTextRecorder, created on first use
+        self.lock = threading.Lock()  # The recorder handles one utterance at a time
+        self.recording_started_at = None  # When voice activity began for the current utterance
+        self.recording_stopped_at = None  # When the current utterance ended and transcription began
+
+    def start(self):
+        # Opens the recorder if it is not already running
+        if self.recorder is None:
+            from RealtimeSTT import AudioToTextRecorder  # Heavy (PyTorch), only loaded when the microphone is used
+            self.recorder = AudioToTextRecorder(
+                model=self.profile.model, device=self.profile.device, compute_type=self.profile.compute_type,
+                on_recording_start=self._recording_started, on_recording_stop=self._recording_stopped
+            )
+        return self
+
+    def _recording_started(self):
+        self.recording_started_at = time.perf_counter()
+
+    def _recording_stopped(self):
+        self.recording_stopped_at = time.perf_counter()
+        if self.recording_started_at is not None:
+            observe("stt_capture", self.recording_stopped_at - self.recording_started_at)  # Length of the utterance
+
+    def transcribe_next(self):
+        # Blocks until the next utterance has been spoken and transcribed
+        return self.capture_next()[0]
+
+    def capture_next(self):
+        # Like transcribe_next, but also returns the utterance's audio (float32 NumPy, 16 kHz) or None
+        self.start()
+        log, audio = [], None
+        with self.lock:
+            try:
+                recorded_text = self.recorder.text()  # Retrieve text from the audio recorder
+                if self.recording_stopped_at is not None:
+                    observe("stt_transcription", time.perf_counter() - self.recording_stopped_at)
+                    self.recording_started_at = self.recording_stopped_at = None
+                print(f"Recorder Output: {recorded_text}")
+                log.append(recorded_text)
+                audio = getattr(self.recorder, "last_transcription_bytes", None)  # Buffer Whisper just transcribed
+            except Exception as e:
+                print(f"Error with AudioToTextRecorder: {e}")  # Handle recording errors gracefully
+        return "\n".join(log), audio
+
+    async def listen(self):
+        # Awaits the next utterance without blocking the event loop
+        return await asyncio.to_thread(self.transcribe_next)
+
+    async def utterances(self):
+        # Async iterator over transcribed utterances, runs until the caller stops iterating
+        while True:
+            yield await self.listen()
+
+    def abort(self):
+        # Interrupts a transcribe_next call that is waiting for speech
+        if self.recorder is not None:
+            self.recorder.abort()
+
+    def shutdown(self):
+        # Releases the microphone and the model
+        if self.recorder is not None:
+            self.recorder.shutdown()
+            self.recorder = None
+
+def get_stt_service():
+    """
+    Returns the shared speech-to-text service, creating it on first use.
+    """
+    return shared("stt_service", _create_stt_service).start()
+
+def _create_stt_service() -> "SpeechToTextService":
+    service = SpeechToTextService()
+    atexit.register(service.shutdown)  # Close the microphone when the process exits
+    return service
+
 async def main_stt():
     """
     Main function to perform real-time speech-to-text recognition and text processing.
-    Uses the AudioToTextRecorder to record and recognize speech.
+    Uses the shared, already loaded recorder to record and recognize one utterance.
+    """
+    return await get_stt_service().listen()
+
+# Sample rate Whisper expects
+WHISPER_SAMPLE_RATE = 16000
+
+# One stretch of speech found in an audio file
+@dataclass
+class SpeechSegment:
+    start: float  # Start time in seconds from the beginning of the file
+    end: float  # End time in seconds
+    audio: object  # Mono float32 NumPy samples at 16 kHz (None once transcribed)
+    text: str = ""  # Transcription, filled in by transcribe_file
+
+class _StreamingResampler:
+    """
+    Linear resampler that keeps its position between chunks, so a file can be
+    converted to 16 kHz piece by piece without clicks at chunk boundaries.
+    """
+
+    def __init__(self, source_rate, target_rate=WHISPER_SAMPLE_RATE):
+        self.step = source_rate / target_rate  # Source samples per output sample
+        self.position = 0.0  # Next output position, relative to the start of the carried-over sample
+        self.carry = None  # Last source sample of the previous chunk
+
+    def process(self, samples):
+        if self.step == 1.0:
+            return samples
+        buffer = samples if self.carry is None else np.concatenate([self.carry, samples])
+        if len(buffer) < 2:
+            self.carry = buffer
+            return np.zeros(0, dtype=np.float32)
+        positions = np.arange(self.position, len(buffer) - 1, self.step)
+        output = np.interp(positions, np.arange(len(buffer)), buffer).astype(np.float32)
+        next_position = positions[-1] + self.step if len(positions) else self.position
+        self.position = next_position - (len(buffer) - 1)  # Re-anchor on the carried-over sample
+        self.carry = buffer[-1:]
+        return output
+
+def _read_wav_chunks(path, chunk_seconds):
+    """
+    Streams a PCM WAV file as mono float32 chunks at 16 kHz, never holding the whole file.
+    """
+    with wave.open(path, 'rb') as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}.get(width)
+        if dtype is None:
+            raise ValueError(f"Unsupported WAV sample width: {width * 8} bits")
+        scale = float(2 ** (8 * width - 1))
+        resampler = _StreamingResampler(rate)
+        frames_per_chunk = max(1, int(rate * chunk_seconds))
+        while True:
+            raw = f.readframes(frames_per_chunk)
+            if not raw:
+                break
+            samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+            if width == 1:
+                samples -= 128.0  # 8-bit WAV is unsigned
+            samples /= scale
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1)  # Mix down to mono
+            yield resampler.process(samples)
+
+def iter_speech_segments(path, chunk_seconds=1.0, frame_ms=30, energy_threshold=0.01,
+                         min_silence_ms=600, min_speech_ms=250, pre_roll_ms=200, max_segment_seconds=28.0):
+    """
+    Splits a WAV file into speech segments with an energy-based voice activity detector.
+    The file is read chunk by chunk; only the current segment (at most
+    max_segment_seconds, under Whisper's 30 s window) is kept in memory, so hour-long
+    recordings use the same memory as short ones.
+    """
+    frame_size = WHISPER_SAMPLE_RATE * frame_ms // 1000  # Samples per VAD frame
+    silence_limit = min_silence_ms // frame_ms  # Silent frames that end a segment
+    min_speech_frames = min_speech_ms // frame_ms  # Shorter bursts are treated as noise
+    max_frames = int(max_segment_seconds * 1000) // frame_ms  # Force a cut for very long speech
+    pre_roll = deque(maxlen=max(1, pre_roll_ms // frame_ms))  # Audio just before speech starts
+
+    noise_floor = energy_threshold / 3  # Adapts to the recording's background level
+    segment, voiced_frames, silent_run = [], 0, 0
+    segment_start = 0
+    frame_index = 0
+    pending = np.zeros(0, dtype=np.float32)
+
+    def finish(end_index):
+        audio = np.concatenate(segment)
+        return SpeechSegment(start=segment_start * frame_ms / 1000, end=end_index * frame_ms / 1000, audio=audio)
+
+    for chunk in _read_wav_chunks(path, chunk_seconds):
+        pending = np.concatenate([pending, chunk])
+        usable = len(pending) // frame_size * frame_size
+        frames, pending = pending[:usable].reshape(-1, frame_size), pending[usable:]
+        energies = np.sqrt(np.mean(frames * frames, axis=1))  # RMS per frame
+        for frame, energy in zip(frames, energies):
+            voiced = energy > max(energy_threshold, 3 * noise_floor)
+            if not voiced:
+                noise_floor = 0.95 * noise_floor + 0.05 * energy
+            if segment:
+                segment.append(frame)
+                if voiced:
+                    voiced_frames += 1
+                    silent_run = 0
+                else:
+                    silent_run += 1
+                if silent_run >= silence_limit or len(segment) >= max_frames:
+                    if voiced_frames >= min_speech_frames:
+                        yield finish(frame_index + 1)
+                    segment, voiced_frames, silent_run = [], 0, 0
+            elif voiced:
+                segment = list(pre_roll) + [frame]  # Keep a little audio before the first voiced frame
+                segment_start = frame_index - len(pre_roll)
+                voiced_frames, silent_run = 1, 0
+                pre_roll.clear()
+            else:
+                pre_roll.append(frame)
+            frame_index += 1
+
+    if segment and voiced_frames >= min_speech_frames:
+        yield finish(frame_index)
+
+_file_models = {}  # Whisper models for file transcription, loaded once per profile
+
+def transcribe_file(path, profile=None, **vad_options):
+    """
+    Generator that transcribes a WAV file segment by segment as it is read.
+    Yields SpeechSegment objects with their text; the audio buffer is released
+    as soon as the segment is transcribed.
     """
-    log = []  # Initialize an empty log to store recognized text
+    from faster_whisper import WhisperModel  # Whisper backend used by RealtimeSTT
 
-    # Use the audio-to-text recorder with specified model and device settings
-    with AudioToTextRecorder(model="tiny", device="cuda", compute_type="float32") as recorder:
-        log = await recorder_and_recognizer(log, recorder)  # Perform recording and recognition
-        await asyncio.sleep(0.005)  # Add a slight delay to simulate real-time processing
+    profile = profile or load_profile()
+    model = _file_models.get(profile)
+    if model is None:
+        model = _file_models[profile] = WhisperModel(profile.model, device=profile.device, compute_type=profile.compute_type)
 
-    return "\n".join(log)  # Join and return the log as a single string of text
+    for segment in iter_speech_segments(path, **vad_options):
+        with span("stt_transcription"):
+            pieces, _ = model.transcribe(segment.audio, vad_filter=False)
+            segment.text = " ".join(piece.text.strip() for piece in pieces).strip()
+        segment.audio = None  # Free the samples before reading further
+        if segment.text:
+            yield segment
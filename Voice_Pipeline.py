@@ -0,0 +1,134 @@
+# Importing required libraries and modules
+import queue  # Bounded queues between the pipeline stages
+import threading  # Each stage runs on its own thread
+from concurrent.futures import TimeoutError as FutureTimeout  # Emotion results that arrive too late
+from typing import Callable, Iterator, Optional, Tuple  # For type hinting
+
+EXIT_COMMAND = "exit."  # Spoken command that ends the voice session
+_EXIT = object()  # Sentinel passed down the pipeline when the session ends
+
+# Voice loop where recording, transcription, generation and rendering overlap
+class VoicePipeline:
+    """
+    Three stages connected by bounded queues:
+      capture  - records and transcribes utterances (SpeechToTextService) and hands
+                 their audio to the optional emotion detector
+      generate - streams the chatbot's response to each utterance
+      render   - the caller iterates over events() and draws them (Streamlit's script thread)
+    The next utterance is already being recorded while the model answers the previous one,
+    so a turn takes about as long as its slowest stage. Full queues block the stage in
+    front of them (backpressure), and saying "exit." or calling stop() shuts everything down.
+    on_finish, if given, runs once the generation stage has stored its last turn (e.g. to
+    release the session lease), which may be after stop() gave up waiting for it.
+    """
+
+    def __init__(self, chatbot, stt_service, emotion_detector=None, utterance_queue_size: int = 2,
+                 event_queue_size: int = 256, emotion_timeout: float = 2.0,
+                 on_finish: Optional[Callable[[], None]] = None):
+        self.chatbot = chatbot  # Generates the responses
+        self.stt_service = stt_service  # Warm speech-to-text service
+        self.emotion_detector = emotion_detector  # Optional voice emotion stage (EmotionDetector)
+        self.emotion_timeout = emotion_timeout  # Longest a response waits for the emotion result
+        self.on_finish = on_finish  # Called when the chatbot is no longer used
+        self.utterances = queue.Queue(maxsize=utterance_queue_size)  # capture -> generate
+        self.events_queue = queue.Queue(maxsize=event_queue_size)  # generate -> render
+        self.stopping = threading.Event()  # Set when the pipeline should wind down
+        self.threads = []  # Stage threads
+
+    def start(self):
+        # Starts the capture and generation stages
+        for target, name in ((self._capture, "voice-capture"), (self._generate, "voice-generate")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        # Cancels the pipeline: interrupts recording and stops generation after the current token
+        self.stopping.set()
+        self.stt_service.abort()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        # Blocking put that gives up when the pipeline is stopping
+        while not self.stopping.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue):
+        # Blocking get that gives up when the pipeline is stopping
+        while not self.stopping.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _EXIT
+
+    def _capture(self):
+        # Stage 1: record and transcribe utterances as fast as the user speaks
+        while not self.stopping.is_set():
+            text, audio = self.stt_service.capture_next()
+            text = text.strip()
+            if self.stopping.is_set():
+                break
+            if text.lower() == EXIT_COMMAND:
+                self._put(self.utterances, _EXIT)
+                break
+            emotion = None  # Classified in the background while the utterance waits in the queue
+            if text and audio is not None and self.emotion_detector is not None:
+                emotion = self.emotion_detector.submit(audio)
+            if not self._put(self.utterances, (text, emotion)):
+                break
+
+    def _generate(self):
+        # Stage 2: stream a response for each utterance into the event queue
+        try:
+            while True:
+                item = self._get(self.utterances)
+                if item is _EXIT:
+                    break
+                text, pending_emotion = item
+                if not text:
+                    self._put(self.events_queue, ("empty", ""))
+                    continue
+                self._put(self.events_queue, ("utterance", text))
+                emotion = None
+                if pending_emotion is not None:
+                    try:
+                        emotion = pending_emotion.result(timeout=self.emotion_timeout)
+                    except FutureTimeout:
+                        emotion = None  # Don't hold the response back for a slow classifier
+                    if emotion:
+                        self._put(self.events_queue, ("emotion", f"{emotion['emotion']} ({emotion['confidence']:.0%})"))
+                tokens = self.chatbot.stream_response(text, emotion=emotion)
+                try:
+                    for token in tokens:
+                        if not self._put(self.events_queue, ("token", token)):
+                            break  # Cancelled mid-response
+                finally:
+                    tokens.close()  # Commits whatever was generated to the history
+                self._put(self.events_queue, ("done", ""))
+        except Exception as e:
+            self._put(self.events_queue, ("error", str(e)))
+        finally:
+            self._put(self.events_queue, ("exit", ""))
+            if self.on_finish is not None:
+                self.on_finish()
+
+    def events(self) -> Iterator[Tuple[str, str]]:
+        # Stage 3: yields (kind, value) events for the caller to render, until the session ends
+        try:
+            while True:
+                item = self._get(self.events_queue)
+                if item is _EXIT:  # Stopped from outside
+                    break
+                yield item
+                if item[0] == "exit":
+                    break
+        finally:
+            self.stop()  # Also runs when the caller stops iterating early
@@ -0,0 +1,74 @@
+# Measures how long importing each entry module takes and which modules it pulls in
+# Usage: python benchmarks/bench_import_time.py [--top 15] [--max-ms 1500]
+# Exits with status 1 if a text-only import pulls in a voice/UI dependency or exceeds --max-ms,
+# so it can guard against import-time regressions.
+import os  # Path handling
+import sys  # Interpreter path and exit status
+import argparse  # To parse command-line arguments
+import subprocess  # Each measurement runs in a fresh interpreter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Repository root
+
+# Modules that text-only callers (Language_Model, Batch_Runner) must not import
+HEAVY_MODULES = ("RealtimeSTT", "torch", "speechbrain", "streamlit", "faster_whisper", "speech_recognition", "numpy")
+
+# Entry modules checked for heavy imports, and ones only reported
+TEXT_ONLY_MODULES = ("Language_Model", "Batch_Runner")
+REPORTED_MODULES = ("Speech_to_text",)
+
+def import_profile(module):
+    # Runs `python -X importtime -c "import module"` and returns [(cumulative_us, self_us, name)]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+def report(module, top, max_ms, check_heavy):
+    # Prints the slowest imports of `module`; returns a list of problems found
+    try:
+        rows = import_profile(module)
+    except RuntimeError as e:
+        print(f"{module}: import failed ({e})")
+        return [] if not check_heavy else [f"{module} failed to import"]
+    total_ms = next((us for us, _, name in rows if name.strip() == module), 0) / 1000
+    print(f"\n{module}: {total_ms:.1f} ms cumulative, {len(rows)} modules")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    problems = []
+    if check_heavy:
+        loaded = {name.strip().split(".")[0] for _, _, name in rows}
+        problems += [f"{module} imports {heavy}" for heavy in HEAVY_MODULES if heavy in loaded]
+        if max_ms and total_ms > max_ms:
+            problems.append(f"{module} took {total_ms:.0f} ms (limit {max_ms} ms)")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-module import time breakdown")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list per entry module")
+    parser.add_argument("--max-ms", type=float, default=0, help="Fail if a text-only import takes longer")
+    args = parser.parse_args()
+
+    problems = []
+    for module in TEXT_ONLY_MODULES:
+        problems += report(module, args.top, args.max_ms, check_heavy=True)
+    for module in REPORTED_MODULES:
+        report(module, args.top, args.max_ms, check_heavy=False)
+
+    if problems:
+        print("\nRegressions:\n  " + "\n  ".join(problems))
+        sys.exit(1)
+    print("\nNo heavy voice/UI modules are imported by text-only entry points.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Memory and allocation cost of in-memory messages over a large history
+# Usage: python benchmarks/bench_messages.py [messages]
+# Builds a synthetic history of stored records (as in the journal or SQLite), then compares the
+# previous dataclass Message with the current slotted one: memory held by all messages, time to
+# load them (as ConversationHistory does, with Message.from_record), and what preparing the
+# prompt messages costs per turn.
+import os  # Path handling
+import sys  # Import path and command-line arguments
+import json  # Records are loaded from JSON lines, as from the journal
+import time  # Measures load and formatting time
+import random  # Synthetic message text
+import datetime  # Timestamps of the synthetic history
+import tracemalloc  # Memory held and allocated
+from dataclasses import dataclass  # The previous Message representation
+from typing import Dict, List, Optional, Union  # For type hinting
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Repository root
+sys.path.insert(0, ROOT)
+
+from Language_Model import Message, api_content, estimate_tokens  # Code under test
+
+WORDS = "I feel tired today because work was long and my sister called about the move again".split()
+
+# Message as it was before the slotted representation, for comparison
+@dataclass
+class DataclassMessage:
+    role: str
+    content: Union[str, List[Dict]]
+    timestamp: str
+    token_count: Optional[int] = None
+
+    def __post_init__(self):
+        if self.token_count is None:
+            self.token_count = estimate_tokens(self.content)
+
+def synthetic_records(count: int) -> List[str]:
+    # Alternating user/assistant records; every tenth user message carries a voice emotion
+    rng = random.Random(0)
+    start = datetime.datetime(2024, 1, 1)
+    records = []
+    for i in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+        if i % 2 == 0:
+            content = [{"type": "text", "text": text}]
+            if i % 20 == 0:
+                content.append({"type": "emotion", "emotion": "sad", "confidence": 0.8})
+            role = "user"
+        else:
+            content, role = text, "assistant"
+        timestamp = (start + datetime.timedelta(seconds=37 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        records.append(json.dumps({"role": role, "content": content, "timestamp": timestamp,
+                                   "token_count": estimate_tokens(content)}))
+    return records
+
+def legacy_format(messages) -> List[Dict]:
+    # The previous format_conversation loop: fresh wrapper dicts every turn
+    return [{"role": msg.role, "content": api_content(msg.content)} for msg in messages]
+
+def current_format(messages) -> List[Dict]:
+    return [msg.api_message() for msg in messages]
+
+def measure(name: str, records: List[str], load_record, format_turn, window: int = 50, turns: int = 1000):
+    # Load time and per-turn formatting time (untraced, as tracemalloc slows every allocation),
+    # then memory held after loading every record and memory of the prompt messages per turn
+    started = time.perf_counter()
+    messages = [load_record(json.loads(line)) for line in records]
+    load_ms = 1000 * (time.perf_counter() - started)
+    context = messages[-window:]
+    format_turn(context)  # First turn builds any caches
+    started = time.perf_counter()
+    for _ in range(turns):
+        format_turn(context)
+    format_us = 1e6 * (time.perf_counter() - started) / turns
+    del messages, context
+    tracemalloc.start()
+    messages = [load_record(json.loads(line)) for line in records]
+    held, _ = tracemalloc.get_traced_memory()
+    context = messages[-window:]
+    format_turn(context)
+    allocated = 0
+    for _ in range(turns):
+        before = tracemalloc.get_traced_memory()[0]
+        formatted = format_turn(context)
+        allocated += tracemalloc.get_traced_memory()[0] - before
+        del formatted
+    tracemalloc.stop()
+    print(f"{name:<10} held {held / 2**20:7.1f} MiB ({held / len(records):6.0f} B/message), "
+          f"load {load_ms:7.1f} ms, format {format_us:6.1f} us/turn, {allocated / turns:6.0f} B new/turn")
+    return held
+
+def main(count: int):
+    records = synthetic_records(count)
+    print(f"{count} messages, prompt window of 50")
+    old = measure("dataclass", records, lambda record: DataclassMessage(**record), legacy_format)
+    new = measure("slotted", records, Message.from_record, current_format)
+    print(f"memory held: {100 * (1 - new / old):.0f}% less")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,47 @@
+# Measures how long a Streamlit rerun of web_ui.py takes once the shared resources are warm
+# Usage: python benchmarks/bench_rerun.py [reruns]
+# Uses Streamlit's AppTest harness, so no browser or server is needed. The first run builds the
+# process-wide resources (session pool, user history, client, stylesheet); later runs should only
+# redraw the page.
+import os  # Path handling and environment
+import sys  # Command-line arguments
+import time  # Measures each run
+import tempfile  # Throwaway history database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Repository root
+sys.path.insert(0, ROOT)
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a list of numbers
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main(reruns):
+    from streamlit.testing.v1 import AppTest  # Headless Streamlit script runner
+    import Resources
+
+    os.environ.setdefault("HF_API_KEY", "benchmark")  # Clients are built but never called
+    os.environ["HISTORY_DB"] = os.path.join(tempfile.mkdtemp(), "bench_history.db")
+
+    app = AppTest.from_file(os.path.join(ROOT, "web_ui.py"), default_timeout=60)
+    app.session_state["authenticated"] = True
+    app.session_state["username"] = "bench"
+
+    times = []
+    for _ in range(reruns + 1):
+        started = time.perf_counter()
+        app.run()
+        times.append(1000 * (time.perf_counter() - started))
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+
+    print(f"first run (builds resources): {times[0]:.1f} ms")
+    rest = times[1:]
+    print(f"reruns: {len(rest)}, p50 {percentile(rest, 0.50):.1f} ms, p95 {percentile(rest, 0.95):.1f} ms, "
+          f"max {max(rest):.1f} ms")
+    print("resources built once:")
+    for name, ms in sorted(Resources.loaded().items(), key=lambda item: -item[1]):
+        print(f"  {name:<40} {ms:8.1f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
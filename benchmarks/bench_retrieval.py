@@ -0,0 +1,64 @@
+# Benchmarks the BM25 retrieval index at a realistic history size
+# Usage: python benchmarks/bench_retrieval.py [messages] [queries]
+import os  # Path handling
+import sys  # Command-line arguments
+import time  # Measures indexing and query time
+import random  # Synthetic but repeatable conversation text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Repository root
+sys.path.insert(0, ROOT)
+
+import Retrieval_Index  # Index under test
+from Retrieval_Index import BM25Index
+
+def synthetic_messages(count, seed=7):
+    # Generates messages whose word frequencies follow a Zipf-like curve, like real chat text
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    cumulative, total = [], 0.0
+    for rank in range(len(vocabulary)):
+        total += 1 / (rank + 1)
+        cumulative.append(total)
+    for _ in range(count):
+        yield " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(5, 60)))
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a list of numbers
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(count, queries, use_numpy):
+    # Builds an index of `count` messages and times `queries` searches
+    Retrieval_Index.use_numpy = use_numpy
+    try:
+        index = BM25Index()
+        started = time.perf_counter()
+        index.extend(synthetic_messages(count))
+        build_s = time.perf_counter() - started
+
+        rng = random.Random(11)
+        query_texts = [" ".join(f"word{rng.randint(0, 3000)}" for _ in range(rng.randint(3, 12))) for _ in range(queries)]
+        timings = []
+        for text in query_texts:
+            started = time.perf_counter()
+            index.search(text, k=3, exclude_from=count - 20)
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        Retrieval_Index.use_numpy = True
+
+    label = "numpy" if use_numpy else "pure python"
+    print(f"{label:<12} {count} messages: build {build_s:.2f} s ({count / build_s:,.0f} msg/s), "
+          f"query p50 {percentile(timings, 0.5):.3f} ms, p95 {percentile(timings, 0.95):.3f} ms, "
+          f"p99 {percentile(timings, 0.99):.3f} ms")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    if Retrieval_Index._numpy() is not None:
+        run(count, queries, use_numpy=True)
+    else:
+        print("NumPy is not installed, only the pure Python scorer is measured.")
+    run(count, queries, use_numpy=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Benchmarks every speech-to-text profile on the bundled "2b voice.wav" recording
+# Usage: python benchmarks/bench_stt_profiles.py [profile ...]
+import os  # Path handling
+import sys  # Command-line arguments and interpreter path
+import json  # Passes results from the worker processes back to the parent
+import time  # Measures load and transcription time
+import wave  # Reads the recording's duration
+import resource  # Peak resident memory of the worker process
+import subprocess  # Runs each profile in a fresh process so memory figures don't mix
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Repository root
+sys.path.insert(0, ROOT)
+
+from Speech_to_text import STT_PROFILES  # Profiles to compare
+
+AUDIO_FILE = os.path.join(ROOT, "2b voice.wav")  # Recording bundled with the repository
+
+def audio_duration(path):
+    # Returns the length of a WAV file in seconds
+    with wave.open(path, 'rb') as f:
+        return f.getnframes() / f.getframerate()
+
+def run_profile(name):
+    # Loads the model for one profile, transcribes the recording and reports timings
+    from faster_whisper import WhisperModel  # Whisper backend used by RealtimeSTT
+
+    profile = STT_PROFILES[name].resolve()
+    started = time.perf_counter()
+    model = WhisperModel(profile.model, device=profile.device, compute_type=profile.compute_type)
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    segments, _ = model.transcribe(AUDIO_FILE)
+    text = " ".join(segment.text.strip() for segment in segments)  # Segments are generated lazily
+    transcribe_s = time.perf_counter() - started
+
+    duration = audio_duration(AUDIO_FILE)
+    return {
+        "profile": name,
+        "model": profile.model,
+        "device": profile.device,
+        "compute_type": profile.compute_type,
+        "load_s": round(load_s, 3),
+        "transcribe_s": round(transcribe_s, 3),
+        "rtf": round(transcribe_s / duration, 3),  # Real-time factor, below 1.0 is faster than real time
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "text": text,
+    }
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        print(json.dumps(run_profile(sys.argv[2])))
+        return
+
+    names = sys.argv[1:] or list(STT_PROFILES)
+    print(f"Audio: {AUDIO_FILE} ({audio_duration(AUDIO_FILE):.1f} s)")
+    print(f"{'profile':<18}{'model':<8}{'device':<7}{'compute':<14}{'load s':>8}{'xcribe s':>10}{'RTF':>7}{'RSS MB':>9}")
+    for name in names:
+        result = subprocess.run([sys.executable, __file__, "--worker", name], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{name:<18}failed: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'unknown error'}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{r['profile']:<18}{r['model']:<8}{r['device']:<7}{r['compute_type']:<14}"
+              f"{r['load_s']:>8.2f}{r['transcribe_s']:>10.2f}{r['rtf']:>7.2f}{r['peak_rss_mb']:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# End-to-end load test: N simulated users chatting through ChatBot.get_response at the same time
+# Usage: python benchmarks/load_test.py --users 16 --turns 20 [--base-url http://127.0.0.1:8089]
+# Without --base-url a local stand-in server (Local_Inference_Server.py) is started in-process with
+# the given --latency-ms / --tokens-per-second / --error-rate / --server-rate-limit. Every user has
+# their own history, so prompts grow turn by turn as in a real conversation. Prints throughput and
+# latency percentiles; with --rate-limit the users share the request scheduler's token buckets.
+import os  # Path handling and environment
+import sys  # Import path
+import time  # Measures each turn
+import random  # Think time and message text
+import argparse  # To parse command-line arguments
+import tempfile  # Throwaway histories
+import threading  # One thread per simulated user
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Repository root
+sys.path.insert(0, ROOT)
+
+from Language_Model import ChatBot, ConversationHistory  # Code under test
+from Local_Inference_Server import LocalInferenceServer, ServerSettings  # Offline stand-in endpoint
+from Scheduler import RequestScheduler  # Shares the rate limit between the simulated users
+
+TOPICS = ("work", "sleep", "my sister", "exams", "moving house", "my new job", "feeling anxious", "a friend")
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a list of numbers
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def user_message(rng):
+    # A user turn of realistic length
+    topic = rng.choice(TOPICS)
+    filler = " ".join(rng.choice(("really", "lately", "again", "honestly", "a lot", "today")) for _ in range(rng.randint(3, 25)))
+    return f"I keep thinking about {topic}, {filler}. What should I do?"
+
+def simulate_user(number, args, base_url, work_dir, scheduler, latencies, errors, lock):
+    # Runs one user's conversation, recording the latency of every turn
+    rng = random.Random(number)
+    history = ConversationHistory(os.path.join(work_dir, f"user{number}.jsonl"), legacy_file=None,
+                                  retrieval=args.retrieval)
+    chatbot = ChatBot(model_name=args.model, history=history, summarize=args.summarize, base_url=base_url,
+                      user=f"user{number}", scheduler=scheduler)
+    for _ in range(args.turns):
+        time.sleep(rng.uniform(0, args.think_ms) / 1000)  # The user reads and types
+        started = time.perf_counter()
+        response = chatbot.get_response(user_message(rng))
+        elapsed = time.perf_counter() - started
+        with lock:
+            if response.startswith("Error:"):
+                errors.append(response)
+            else:
+                latencies.append(elapsed)
+    chatbot.close()
+
+def main(args):
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = LocalInferenceServer(ServerSettings(
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tokens_per_second=args.tokens_per_second,
+            reply_tokens=args.reply_tokens, error_rate=args.error_rate, rate_limit=args.server_rate_limit)).start()
+        base_url = server.base_url
+    os.environ.setdefault("HF_API_KEY", "load-test")
+
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    scheduler = RequestScheduler(rate=args.rate_limit, user_rate=args.user_rate_limit)
+    latencies, errors, lock = [], [], threading.Lock()
+    threads = [threading.Thread(target=simulate_user, args=(i, args, base_url, work_dir, scheduler, latencies, errors, lock))
+               for i in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.stop()
+
+    total = len(latencies) + len(errors)
+    print(f"{args.users} users x {args.turns} turns against {base_url}")
+    print(f"throughput: {len(latencies) / elapsed:.2f} turns/s over {elapsed:.1f} s, "
+          f"errors: {len(errors)}/{total} ({100 * len(errors) / total if total else 0:.1f}%)")
+    if latencies:
+        ms = [1000 * x for x in latencies]
+        print(f"latency: p50 {percentile(ms, 0.50):.1f} ms, p95 {percentile(ms, 0.95):.1f} ms, "
+              f"p99 {percentile(ms, 0.99):.1f} ms, max {max(ms):.1f} ms")
+    if server is not None:
+        print(f"server: {server.stats['requests']} requests, {server.stats['rate_limited']} answered 429")
+    print(f"scheduler: {scheduler.stats()['interactive']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent end-to-end load test of ChatBot.get_response")
+    parser.add_argument("--users", type=int, default=16, help="Simulated users chatting at the same time")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per user")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="Longest pause between a user's turns")
+    parser.add_argument("--model", default="meta-llama/Llama-3.2-11B-Vision-Instruct", help="Model name sent")
+    parser.add_argument("--base-url", help="Existing endpoint to test instead of the in-process stand-in")
+    parser.add_argument("--summarize", action="store_true", help="Also run the background summarizer")
+    parser.add_argument("--retrieval", action="store_true", help="Also recall older messages")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Stand-in: time to the first token")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Stand-in: random extra latency")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Stand-in: generation speed")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Stand-in: tokens per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stand-in: share of failing requests")
+    parser.add_argument("--server-rate-limit", type=float, default=0.0, help="Stand-in: requests/s before 429")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Scheduler: global requests/s (0 = off)")
+    parser.add_argument("--user-rate-limit", type=float, default=0.0, help="Scheduler: requests/s per user")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    main(parse_args())
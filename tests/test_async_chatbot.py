@@ -0,0 +1,33 @@
+# AsyncChatBot must work from more than one event loop in the same process
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip("huggingface_hub")
+
+from Language_Model import AsyncChatBot, ConversationHistory  # noqa: E402
+from Local_Inference_Server import LocalInferenceServer, ServerSettings  # noqa: E402
+
+@pytest.fixture
+def server():
+    server = LocalInferenceServer(ServerSettings(latency_ms=1, jitter_ms=0, tokens_per_second=0)).start()
+    yield server
+    server.stop()
+
+def test_two_event_loops_back_to_back(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(AsyncChatBot, "max_connections", 1)  # Callers wait, binding the semaphore to the loop
+    chatbots = [AsyncChatBot(history=ConversationHistory(str(tmp_path / f"history{i}.jsonl"), legacy_file=None),
+                             summarize=False, base_url=server.base_url) for i in range(3)]
+
+    async def turns(text):
+        return await AsyncChatBot.agather((chatbot, text) for chatbot in chatbots)
+
+    for text in ("hello", "hello again"):  # The second run gets a new loop, client and semaphore
+        responses = asyncio.run(turns(text))
+        assert not any(response.startswith("Error:") for response in responses), responses
+    assert all(len(chatbot.history.messages) == 4 for chatbot in chatbots)
+    for chatbot in chatbots:
+        chatbot.close()
@@ -0,0 +1,43 @@
+# Images attached to a turn reach the model; the stored text holds only what the user wrote
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip("huggingface_hub")
+Image = pytest.importorskip("PIL.Image")
+
+from Image_Store import ImageStore  # noqa: E402
+from Language_Model import IMAGE_PLACEHOLDER, ChatBot, ConversationHistory  # noqa: E402
+
+def png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def chatbot(tmp_path):
+    history = ConversationHistory(str(tmp_path / "history.jsonl"), legacy_file=None, write_behind=False)
+    chatbot = ChatBot(history=history, summarize=False, personality_file=None,
+                      base_url="http://127.0.0.1:9")  # Never contacted, prompts are only formatted
+    chatbot.images = ImageStore(directory=str(tmp_path / "images"))
+    yield chatbot
+    chatbot.close()
+
+def image_parts(message):
+    return [part for part in message["content"] if part["type"] == "image_url"]
+
+def test_every_image_of_a_multi_image_turn_is_sent(chatbot):
+    earlier = chatbot.attach_images([png("red"), png("green")])
+    chatbot.commit_turn(chatbot.pending_message("two photos from last week", images=earlier), "Nice!")
+    pending = chatbot.pending_message("compare these two photos",
+                                      images=chatbot.attach_images([png("blue"), png("white")]))
+
+    messages = chatbot.format_conversation(pending)
+
+    assert len(image_parts(messages[-1])) == 2  # Both new images, despite max_prompt_images=1
+    assert len(image_parts(messages[-3])) == 1  # Earlier turns stay within max_prompt_images
+    assert pending.text == "compare these two photos"
+    assert IMAGE_PLACEHOLDER not in chatbot.history.messages[0].text
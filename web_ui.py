@@ -1,201 +1,35 @@
 # Import necessary libraries
 import streamlit as st  # Web framework for creating interactive web apps
 from streamlit_option_menu import option_menu  # For creating styled navigation menus
-from Language_Model import ChatBot  # Import custom ChatBot class for AI interactions
-from Speech_to_text import main_stt  # Import speech-to-text module
-import asyncio  # For asynchronous programming
+from Session_Pool import get_session_pool  # One ChatBot (history and personality) per signed-in user
+from Metrics import span, observe, configure_from_env  # Per-stage latency tracing
+from Resources import shared  # Objects that survive reruns
+import os  # Locates the stylesheet
+import re  # Minifies the stylesheet
 import time  # To add delays in execution
 
-# Initialize ChatBot instance for AI functionality
-chatbot = ChatBot()
+rerun_started = time.perf_counter()  # Streamlit runs this whole script again on every interaction
 
-# Custom CSS for Streamlit styling with new color palette and animations
-st.markdown("""
-<style>
-    /* Custom color variables */
-    :root {
-        --primary-color: #A6B37D;
-        --background-color: #FEFAE0;
-        --secondary-bg-color: #B99470;
-        --text-color: #C0C78C;
-    }
+# Optional latency metrics (METRICS_PORT / METRICS_JSON), started once per process
+shared("metrics", configure_from_env)
 
-    /* Styling the main container */
-    .main {
-        padding: 2rem;
-        background-color: var(--background-color);
-        font-family: 'sans serif';
-    }
-    
-    /* Set background color for the app by Override Streamlit's default background */
-    .stApp {
-        background-color: var(--background-color);
-    }
-    
-    /* Sidebar styling with animation states */
-    .css-1d391kg {
-        padding-top: 3.5rem;
-        background-color: var(--secondary-bg-color);
-        transition: transform 0.3s ease-in-out;
-    }
-    
-    /* Toggle for sidebar visibility */
-    .sidebar-hidden {
-        transform: translateX(-100%);
-    }
-    
-    .sidebar-visible {
-        transform: translateX(0);
-        box-shadow: 2px 0 10px rgba(0, 0, 0, 0.1);
-    }
-    
-    /* Custom toggle button for the sidebar */
-    .sidebar-toggle {
-        position: fixed;
-        left: 0;
-        top: 0;
-        padding: 12px 15px;
-        background: var(--primary-color);
-        border: none;
-        color: white;
-        z-index: 999;
-        border-radius: 0 0 5px 0;
-        transition: all 0.3s ease;
-    }
-    
-    .sidebar-toggle:hover {
-        background: var(--secondary-bg-color);
-        padding-right: 25px;
-    }
+def load_style() -> str:
+    # Reads web_ui.css and strips comments and indentation before it is embedded in the page
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "web_ui.css"), 'r') as f:
+        css = re.sub(r"/\*.*?\*/", "", f.read(), flags=re.S)
+    return "<style>" + " ".join(line.strip() for line in css.splitlines() if line.strip()) + "</style>"
 
-    /* Styling for Card-like containers */
-    .stForm {
-        background-color: var(--secondary-bg-color);
-        padding: 2rem;
-        border-radius: 10px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        transition: transform 0.3s ease;
-    }
-    
-    .stForm:hover {
-        transform: translateY(-5px);
-    }
-    
-    /* Styling buttons */
-    .stButton>button {
-        background-color: var(--primary-color);
-        color: white;
-        border: none;
-        border-radius: 5px;
-        padding: 0.5rem 1rem;
-        transition: all 0.3s;
-    }
-    
-    .stButton>button:hover {
-        background-color: var(--secondary-bg-color);
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
-    }
-
-    /* Text area styling */
-    .stTextArea>div>div>textarea {
-        background-color: white;
-        color: var(--text-color);
-        border: 1px solid var(--primary-color);
-        border-radius: 5px;
-        transition: border 0.3s ease;
-    }
-    
-    .stTextArea>div>div>textarea:focus {
-        border: 2px solid var(--primary-color);
-        box-shadow: 0 0 5px rgba(166, 179, 125, 0.3);
-    }
-    
-    /* Header styling */
-    h1, h2, h3 {
-        color: var(--primary-color);
-        margin-bottom: 1.5rem;
-        font-family: 'sans serif';
-    }
-    
-    /* Info messages styling */
-    .stAlert {
-        background-color: var(--secondary-bg-color);
-        border-radius: 5px;
-        color: white;
-        animation: fadeIn 0.5s ease-in;
-    }
-    
-    /* Text input styling */
-    .stTextInput>div>div>input {
-        background-color: white;
-        color: var(--text-color);
-        border: 1px solid var(--primary-color);
-        border-radius: 5px;
-        transition: all 0.3s ease;
-    }
-    
-    .stTextInput>div>div>input:focus {
-        border: 2px solid var(--primary-color);
-        box-shadow: 0 0 5px rgba(166, 179, 125, 0.3);
-    }
-    
-    /* Animations */
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(-10px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    
-    @keyframes slideIn {
-        from { transform: translateX(-100%); }
-        to { transform: translateX(0); }
-    }
-    
-    /* Animation classes */
-    .animate-fade-in {
-        animation: fadeIn 0.5s ease-in;
-    }
-    
-    .animate-slide-in {
-        animation: slideIn 0.3s ease-in-out;
-    }
-    
-    /* Custom scrollbar */
-    ::-webkit-scrollbar {
-        width: 8px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: var(--background-color);
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: var(--primary-color);
-        border-radius: 4px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: var(--secondary-bg-color);
-    }
-</style>
-
-<script>
-    // JavaScript for handling sidebar animations
-    const toggleSidebar = () => {
-        const sidebar = document.querySelector('.css-1d391kg');
-        sidebar.classList.toggle('sidebar-hidden');
-        sidebar.classList.toggle('sidebar-visible');
-    }
-</script>
-""", unsafe_allow_html=True)  # Injects the CSS into the app
+# Custom CSS for Streamlit styling with new color palette and animations (web_ui.css),
+# read and minified once per process; only the small result is sent on each rerun
+st.markdown(shared("ui_style", load_style), unsafe_allow_html=True)  # Injects the CSS into the app
 
 # Rest of your Python code remains the same as in the previous artifact, starting from:
-# Mock user database
-USER_DB = {
+# Mock user database, shared by all sessions so sign-ups survive reruns
+USER_DB = shared("user_db", lambda: {
     "admin": "admin123",
     "user1": "password1",
     "user2": "password2"
-}
+})
 
 # Initialize session states if not already present
 if "authenticated" not in st.session_state:
@@ -282,12 +116,18 @@ def signin_signup():
                     time.sleep(1)  # Short delay before redirect
                     st.rerun()  # Reload the app
 
+# Returns the signed-in user's ChatBot, loading their history on first use
+def current_chatbot():
+    return get_session_pool().get(st.session_state.username)
+
 # Sidebar functionality
 def sidebar():
+    chatbot = current_chatbot()
     with st.sidebar:  # Define sidebar content
         st.title("Menu")  # Sidebar title
         st.markdown("---")  # Divider
         if st.button("Sign Out", key="signout"):  # Sign out button
+            get_session_pool().drop(st.session_state.username)  # Flush the session, it is reloaded on the next sign in
             st.session_state.authenticated = False  # Reset authentication
             st.session_state.username = None  # Clear username
             st.rerun()  # Reload the app
@@ -307,6 +147,7 @@ def sidebar():
 
 # Main user interface
 def main_ui():
+    chatbot = current_chatbot()  # This user's own history and personality
     if st.button("☰", key="toggle_sidebar"):  # Sidebar toggle button
         st.session_state.show_sidebar = not st.session_state.show_sidebar  # Toggle sidebar visibility
 
@@ -327,24 +168,36 @@ def main_ui():
         if st.session_state.recording:  # If recording
             st.info("🎙️ Recording in progress...")  # Recording message
             try:
-                while True:  # Continuously record speech
-                    loop = asyncio.new_event_loop()  # Create new event loop
-                    asyncio.set_event_loop(loop)  # Set event loop
-                    recorded_text = loop.run_until_complete(main_stt())  # Get recorded text
-                    
-                    if recorded_text.strip():  # If speech is detected
-                        st.text_area("📝 Speech-to-Text Output", value=recorded_text, height=100)  # Display speech output
-                        if recorded_text.lower() == "exit.":  # Stop recording if "exit." is said
-                            st.session_state.recording = False
-                            break
-                        
-                        with st.spinner("🤖 Generating response..."):  # Show spinner while processing
-                            ai_response = chatbot.get_response(recorded_text)  # Get AI response
-                        
-                        st.text_area("🤖 AI Response", value=ai_response, height=200)  # Display AI response
-                        st.session_state.recording = True  # Continue recording
-                    else:
+                # Voice modules (RealtimeSTT, PyTorch, SpeechBrain) are only loaded once recording starts
+                from Speech_to_text import get_stt_service  # Import the shared speech-to-text service
+                from Voice_Pipeline import VoicePipeline  # Overlapping record/generate/render stages
+                from Emotion_Detector import get_emotion_detector  # Voice tone classification
+
+                # Recording, transcription, generation and rendering run as overlapping stages
+                stt_service, emotion_detector = get_stt_service(), get_emotion_detector()
+                pool, username = get_session_pool(), st.session_state.username
+                # The generation stage holds its own lease, it may outlive this rerun by a turn
+                pipeline = VoicePipeline(pool.acquire(username), stt_service, emotion_detector,
+                                         on_finish=lambda: pool.release(username)).start()
+                turn = 0  # Numbers the widgets of each turn so their keys stay unique
+                for kind, value in pipeline.events():
+                    if kind == "utterance":  # Speech detected and transcribed
+                        turn += 1
+                        st.text_area("📝 Speech-to-Text Output", value=value, height=100, key=f"stt_output_{turn}")  # Display speech output
+                        st.markdown("🤖 **AI Response**")
+                        response_box, response = st.empty(), ""
+                    elif kind == "emotion":  # Tone detected in the user's voice
+                        st.caption(f"🎭 Voice tone: {value}")
+                    elif kind == "token":  # Render the response as it is generated
+                        with span("ui_render"):
+                            response += value
+                            response_box.markdown(response)
+                    elif kind == "empty":
                         st.warning("🔇 No speech detected. Please try again.")  # Warning for no speech
+                    elif kind == "error":
+                        st.error(f"❌ Error: {value}")
+                    elif kind == "exit":  # "exit." was said
+                        st.session_state.recording = False
             except Exception as e:  # Handle exceptions
                 st.error(f"❌ Error: {str(e)}")  # Display error
                 st.session_state.recording = False
@@ -353,13 +206,18 @@ def main_ui():
 
         # Add text input field with Enter functionality
         st.subheader("Text Input Interface")
-        with st.form("text_input_form"):
+        with st.form("text_input_form", clear_on_submit=True):
             user_input = st.text_input("💬 Type your query and press Enter:")
+            uploads = st.file_uploader("🖼️ Attach images", type=["png", "jpg", "jpeg", "webp"],
+                                       accept_multiple_files=True)
             submitted = st.form_submit_button("Submit")
-            if submitted and user_input.strip():
-                with st.spinner("🤖 Generating response..."):
-                    ai_response = chatbot.get_response(user_input)
-                st.text_area("🤖 AI Response", value=ai_response, height=200)
+            if submitted and (user_input.strip() or uploads):
+                images = [upload.getvalue() for upload in uploads or []]  # Downscaled and cached by the chatbot
+                if images:
+                    st.image(images, width=120)
+                st.markdown("🤖 **AI Response**")
+                with span("ui_turn"):  # Whole streamed turn, as the user sees it
+                    st.write_stream(chatbot.stream_response(user_input, images=images))  # Render tokens as they arrive
             elif submitted:
                 st.warning("Please enter a query.")
 
@@ -377,4 +235,6 @@ if __name__ == "__main__":
     if not st.session_state.authenticated:  # If user is not authenticated
         signin_signup()  # Show Sign In/Sign Up
     else:
-        main_ui()  # Show main UI
+        with get_session_pool().lease(st.session_state.username):  # Not evicted while this rerun streams or records
+            main_ui()  # Show main UI
+    observe("ui_rerun", time.perf_counter() - rerun_started)  # Cost of one rerun, without the one-time setup